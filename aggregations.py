@@ -0,0 +1,124 @@
+"""This module computes the aggregations shown on the passengers and journeys pages.
+
+Every grouping is computed once for both metrics, so the two pages share
+the same cached results for a rail line. The rollups of a line are sliced
+from the rollup files of the ETL, or computed with SQL over the processed
+files when the RAIL_BACKEND environment variable is set to duckdb.
+"""
+
+import os
+
+import data_access as access
+import data_storage as storage
+import instrumentation as instrument
+import sql_backend as sql
+
+METRICS = ['passanger_cnt', 'passage_cnt']
+LINE_ROLLUPS = ['daily', 'monthly', 'age_station', 'holiday', 'kpi', 'kpi_extremes',
+                'station_geometry']
+BACKENDS = ['pandas', 'duckdb']
+BACKEND = os.environ.get('RAIL_BACKEND', 'pandas')
+if BACKEND not in BACKENDS:
+    raise ValueError(f"RAIL_BACKEND must be one of {BACKENDS}, not {BACKEND!r}")
+
+
+def line_rollups(dataset_dir: str, line: str, backend: str = None):
+    """Return the rollups of a line from the given or configured backend."""
+    if (backend or BACKEND) == 'duckdb':
+        return sql.line_rollups(dataset_dir, line)
+    return {name: access.line_rollup(dataset_dir, name, line) for name in LINE_ROLLUPS}
+
+
+def line_kpis(kpi):
+    """Index the KPI rows of a line by metric, for the info cards."""
+    return {row['metric']: row for row in kpi.to_dict('records')}
+
+
+def line_extremes(extremes):
+    """Index the extreme rows of a line by (metric, scope, extreme, group).
+
+    The value and group columns are named after the metric and the scope,
+    like the rollup rows they were selected from.
+    """
+    indexed = {}
+    for key, rows in extremes.groupby(['metric', 'scope', 'extreme', 'group'], observed=True):
+        metric, scope = key[0], key[1]
+        indexed[key] = rows.rename(columns={'value': metric, 'group': scope})
+    return indexed
+
+
+def info_metrics(kpis: dict, extremes: dict):
+    """Collect the line totals and the busiest and quietest station day of each metric."""
+    info = {}
+    for metric in METRICS:
+        max_row = extremes[metric, 'day', 'max', ''].iloc[0]
+        min_row = extremes[metric, 'day', 'min', ''].iloc[0]
+        info[metric] = {'total': kpis[metric]['total'],
+                        'mean': kpis[metric]['mean'],
+                        'records': kpis[metric]['records'],
+                        'max_value': max_row[metric],
+                        'max_date': max_row['date'],
+                        'max_station': max_row['station_name'],
+                        'min_value': min_row[metric],
+                        'min_date': min_row['date'],
+                        'min_station': min_row['station_name']}
+    return info
+
+
+def compute_line_aggregations(dataset_dir: str, line: str):
+    """Compute every page section of a rail line for both metrics."""
+    with instrument.measure('aggregations', line=line) as sample:
+        aggregations = aggregate_line(dataset_dir, line)
+        sample['rows'] = len(aggregations['daily'])
+    return aggregations
+
+
+def aggregate_line(dataset_dir: str, line: str, backend: str = None):
+    """Compute the aggregations of a rail line from its rollups."""
+    frames = line_rollups(dataset_dir, line, backend)
+    daily = frames['daily']
+    monthly = frames['monthly']
+    age_station = frames['age_station']
+    holiday = frames['holiday']
+    age = age_station.groupby('age', observed=True)[METRICS].sum()
+    extremes = line_extremes(frames['kpi_extremes'])
+    aggregations = {'line': line,
+                    # Identifies the build the aggregations were computed from
+                    'version': storage.file_hash(f"{dataset_dir}/rollups/daily.parquet"),
+                    'daily': daily,
+                    'monthly': monthly,
+                    'age_station': age_station,
+                    'age': age,
+                    'holiday': holiday,
+                    'geometry': frames['station_geometry'],
+                    'months': daily['month'].unique().tolist(),
+                    'info': info_metrics(line_kpis(frames['kpi']), extremes),
+                    'extremes': extremes,
+                    'holiday_max': {}, 'holiday_min': {}}
+    for metric in METRICS:
+        aggregations['holiday_max'][metric] = holiday[holiday[metric] == holiday[metric].max()]
+        aggregations['holiday_min'][metric] = holiday[holiday[metric] == holiday[metric].min()]
+    return aggregations
+
+
+def line_aggregations(dataset_dir: str, line: str):
+    """Return the cached aggregations of a rail line, shared by every page and session."""
+    return access.cached_load(f"{dataset_dir}/rollups/daily.parquet",
+                              lambda: compute_line_aggregations(dataset_dir, line),
+                              key=('aggregations', line))
+
+
+def holiday_stations(aggregations: dict, metric: str, holiday_date):
+    """Return the station counts on a holiday with its highest and lowest rows."""
+    daily = aggregations['daily']
+    holiday_cnt = daily[daily['date'] == holiday_date][['station_name', metric]]
+    max_row = holiday_cnt[holiday_cnt[metric] == holiday_cnt[metric].max()]
+    min_row = holiday_cnt[holiday_cnt[metric] == holiday_cnt[metric].min()]
+    return holiday_cnt, max_row, min_row
+
+
+def week_stations(aggregations: dict, metric: str, month: str, week_number: int):
+    """Return the daily station counts of a week of a month."""
+    daily = aggregations['daily']
+    return daily[(daily['month'] == month) & (daily['week_number'] == week_number)][
+        ['date', 'month', 'week_number', 'day_of_week', 'station_name', metric]]
@@ -0,0 +1,68 @@
+"""This module loads the Lottie animations shown on the app pages.
+
+An animation is read from the local assets directory. When it is not there
+yet, it is fetched once in a background thread with a timeout and saved for
+the next runs, while the page renders without it. Setting LOTTIE_FETCH=0
+disables the remote fetch entirely.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+import data_access as access
+
+ASSETS_DIR = Path(__file__).resolve().parent / "assets" / "lottie"
+FETCH_TIMEOUT = 5
+# Seconds to wait before fetching an animation again after a failed fetch
+RETRY_AFTER = 300
+FETCH_REMOTE = os.environ.get('LOTTIE_FETCH', '1') != '0'
+
+_fetching = set()
+_failed = {}
+_lock = threading.Lock()
+
+
+def asset_path(url: str):
+    """Return the local path of the animation of a url."""
+    return ASSETS_DIR / url.rsplit('/', 1)[-1]
+
+
+def fetch_animation(url: str, path: Path):
+    """Download an animation and save it to the assets directory."""
+    try:
+        response = requests.get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        animation = response.json()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(animation), encoding='utf-8')
+        temporary.replace(path)
+    except (requests.RequestException, ValueError, OSError):
+        with _lock:
+            _failed[url] = time.monotonic()
+    finally:
+        with _lock:
+            _fetching.discard(url)
+
+
+def load_animation(url: str, fetch: bool = FETCH_REMOTE):
+    """Return the animation of a url from the local assets, None while it is not available.
+
+    A missing animation is fetched in the background, so it shows up on a
+    later run without the current one waiting for the network.
+    """
+    path = asset_path(url)
+    if path.exists():
+        return access.cached_load(str(path), lambda: json.loads(path.read_text(encoding='utf-8')))
+    if fetch:
+        with _lock:
+            if url in _fetching or time.monotonic() - _failed.get(url, -RETRY_AFTER) < RETRY_AFTER:
+                return None
+            _fetching.add(url)
+        threading.Thread(target=fetch_animation, args=(url, path), daemon=True).start()
+    return None
@@ -0,0 +1,300 @@
+"""This module serves the aggregations of the app pages as a local read-only JSON API.
+
+It reads the same shared data cache as the pages, so a line is aggregated
+once per process. Every response is cached for its data version and sent
+with an ETag, so a client repeating a request with If-None-Match gets an
+empty 304 response. Requests are handled in parallel threads.
+
+    python api.py --port 8600
+    curl "http://127.0.0.1:8600/months?line=M2-YENIKAPI-HACIOSMAN&month=May"
+
+Endpoints, each taking the line and an optional metric (passanger_cnt by
+default) as query parameters:
+
+    /lines                               the lines with their row counts
+    /info?line=                          totals and busiest and quietest station days
+    /months?line=[&month=]               station counts of every month or of a month
+    /holidays?line=[&holiday=]           holiday totals, or station counts on a holiday
+    /ages?line=[&age=]                   age group totals, or station counts of an age group
+    /weeks?line=&month=&week=            daily station counts of a week of a month
+
+The rows of a line are streamed as csv or parquet from /export, filtered by
+an inclusive date range and any number of age, station and column
+parameters:
+
+    /export?line=[&start=&end=&age=&station=&column=&format=csv|parquet]
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import aggregations as aggs
+import data_access as access
+import data_storage as storage
+import export
+import instrumentation as instrument
+
+MAX_RESPONSES = 1024
+
+_responses = OrderedDict()
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+class ApiError(Exception):
+    """A request the API can not answer, with its HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def records(frame):
+    """Return the rows of a frame as a list of dicts."""
+    return frame.to_dict('records')
+
+
+def required(params: dict, name: str):
+    """Return a query parameter, failing with 400 when it is missing."""
+    if name not in params:
+        raise ApiError(400, f"Missing the {name} parameter")
+    return params[name]
+
+
+def line_aggregations(dataset_dir: str, params: dict):
+    """Return the aggregations of the requested line and the requested metric."""
+    line = required(params, 'line')
+    if line not in {entry['line'] for entry in access.load_manifest(dataset_dir)['lines']}:
+        raise ApiError(404, f"Unknown line {line!r}")
+    metric = params.get('metric', aggs.METRICS[0])
+    if metric not in aggs.METRICS:
+        raise ApiError(400, f"The metric must be one of {aggs.METRICS}")
+    return aggs.line_aggregations(dataset_dir, line), metric
+
+
+def lines(dataset_dir: str, params: dict):
+    """List the lines with their row counts."""
+    return [{'line': entry['line'], 'rows': entry['rows']}
+            for entry in access.load_manifest(dataset_dir)['lines']]
+
+
+def info(dataset_dir: str, params: dict):
+    """Return the totals and the busiest and quietest station days of a line."""
+    line_aggs, metric = line_aggregations(dataset_dir, params)
+    return line_aggs['info'][metric]
+
+
+def months(dataset_dir: str, params: dict):
+    """Return the station counts of every month, or of the requested month."""
+    line_aggs, metric = line_aggregations(dataset_dir, params)
+    monthly = line_aggs['monthly']
+    if 'month' in params:
+        if params['month'] not in line_aggs['months']:
+            raise ApiError(404, f"No data for the month {params['month']!r}")
+        monthly = monthly[monthly['month'] == params['month']]
+    return records(monthly[['month', 'station_name', metric]])
+
+
+def holidays(dataset_dir: str, params: dict):
+    """Return the totals of every holiday, or the station counts on the requested holiday."""
+    line_aggs, metric = line_aggregations(dataset_dir, params)
+    holiday_dates = access.load_holiday_dates(dataset_dir)
+    if 'holiday' not in params:
+        totals = line_aggs['holiday'].groupby('date')[metric].sum()
+        return [{'holiday': label, 'date': date, metric: totals.get(date, 0)}
+                for label, date in holiday_dates.items()]
+    if params['holiday'] not in holiday_dates.index:
+        raise ApiError(404, f"Unknown holiday {params['holiday']!r}")
+    holiday_cnt, _, _ = aggs.holiday_stations(line_aggs, metric,
+                                              holiday_dates[params['holiday']])
+    return records(holiday_cnt)
+
+
+def ages(dataset_dir: str, params: dict):
+    """Return the totals of every age group, or the station counts of the requested one."""
+    line_aggs, metric = line_aggregations(dataset_dir, params)
+    if 'age' not in params:
+        return records(line_aggs['age'][[metric]].reset_index())
+    age_station = line_aggs['age_station']
+    age_station = age_station[age_station['age'] == params['age']]
+    if age_station.empty:
+        raise ApiError(404, f"No data for the age group {params['age']!r}")
+    return records(age_station[['age', 'station_name', metric]])
+
+
+def weeks(dataset_dir: str, params: dict):
+    """Return the daily station counts of a week of a month."""
+    line_aggs, metric = line_aggregations(dataset_dir, params)
+    try:
+        week_number = int(required(params, 'week'))
+    except ValueError:
+        raise ApiError(400, "The week must be a number") from None
+    week = aggs.week_stations(line_aggs, metric, required(params, 'month'), week_number)
+    if week.empty:
+        raise ApiError(404, "No data for this week")
+    return records(week)
+
+
+def export_options(dataset_dir: str, query: dict):
+    """Return the export arguments of the query parameters of an /export request."""
+    params = {name: values[-1] for name, values in query.items()}
+    line = required(params, 'line')
+    if line not in {entry['line'] for entry in access.load_manifest(dataset_dir)['lines']}:
+        raise ApiError(404, f"Unknown line {line!r}")
+    export_format = params.get('format', 'csv')
+    if export_format not in export.FORMATS:
+        raise ApiError(400, f"The format must be one of {list(export.FORMATS)}")
+    columns = query.get('column', export.EXPORT_COLUMNS)
+    unknown = [column for column in columns if column not in storage.PROCESSED_SCHEMA]
+    if unknown:
+        raise ApiError(400, f"Unknown columns {unknown}")
+    try:
+        start, end = (datetime.date.fromisoformat(params[name]) if name in params else None
+                      for name in ('start', 'end'))
+    except ValueError:
+        raise ApiError(400, "The start and end must be dates as YYYY-MM-DD") from None
+    return {'line': line, 'export_format': export_format, 'columns': columns,
+            'start': start, 'end': end,
+            'ages': query.get('age'), 'stations': query.get('station')}
+
+
+ROUTES = {'/lines': lines,
+          '/info': info,
+          '/months': months,
+          '/holidays': holidays,
+          '/ages': ages,
+          '/weeks': weeks}
+
+
+def to_json(value):
+    """Convert the numpy and pandas values of a response to JSON values."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def data_version(dataset_dir: str):
+    """Return the mtime and size of the build outputs the responses are computed from."""
+    stat = Path(f"{dataset_dir}/rollups/daily.parquet").stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def cached_response(dataset_dir: str, path: str, params: dict):
+    """Return the JSON body and ETag of a request, computed once for each data version."""
+    key = (path, tuple(sorted(params.items())))
+    version = data_version(dataset_dir)
+    with _lock:
+        entry = _responses.get(key)
+        if entry is not None and entry['version'] == version:
+            _responses.move_to_end(key)
+            _stats['hits'] += 1
+            return entry['body'], entry['etag']
+    with instrument.measure(f'api{path}'):
+        body = json.dumps(ROUTES[path](dataset_dir, params), default=to_json,
+                          ensure_ascii=False).encode('utf-8')
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    with _lock:
+        _stats['misses'] += 1
+        _responses[key] = {'version': version, 'body': body, 'etag': etag}
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_RESPONSES:
+            _responses.popitem(last=False)
+    return body, etag
+
+
+def response_stats():
+    """Return hit and miss counts of the response cache."""
+    with _lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses'], 'entries': len(_responses)}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Answer GET requests for the routes of the API."""
+
+    dataset_dir = None
+
+    def send_json(self, status: int, body: bytes, etag: str = None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_export(self, query: dict):
+        """Stream the rows of an export, one record batch at a time."""
+        try:
+            options = export_options(self.dataset_dir, query)
+        except ApiError as error:
+            self.send_json(error.status, json.dumps({'error': str(error)}).encode('utf-8'))
+            return
+        except Exception as error:
+            self.log_error("%s failed: %r", self.path, error)
+            self.send_json(500, json.dumps({'error': f"Internal error: {error}"}).encode('utf-8'))
+            return
+        file_name = f"{storage.line_partition_name(options['line'])}.{options['export_format']}"
+        self.send_response(200)
+        self.send_header('Content-Type', export.FORMATS[options['export_format']])
+        self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+        self.end_headers()
+        # Without a content length the end of the response is the closed connection
+        with instrument.measure('api/export', line=options['line']) as sample:
+            sample['rows'] = export.export_line(self.dataset_dir, sink=self.wfile, **options)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        params = {name: values[-1] for name, values in query.items()}
+        path = url.path.rstrip('/') or '/'
+        if path == '/export':
+            self.send_export(query)
+            return
+        try:
+            if path not in ROUTES:
+                raise ApiError(404, f"Unknown endpoint {path!r}, "
+                                    f"use one of {list(ROUTES) + ['/export']}")
+            body, etag = cached_response(self.dataset_dir, path, params)
+        except ApiError as error:
+            self.send_json(error.status, json.dumps({'error': str(error)}).encode('utf-8'))
+            return
+        except Exception as error:
+            # A missing build or a failing route still gets a response
+            self.log_error("%s failed: %r", self.path, error)
+            self.send_json(500, json.dumps({'error': f"Internal error: {error}"}).encode('utf-8'))
+            return
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_json(304, b'', etag)
+            return
+        self.send_json(200, body, etag)
+
+
+def serve(dataset_dir: str, host: str = '127.0.0.1', port: int = 8600):
+    """Create a threaded API server for a dataset directory, serve it with serve_forever()."""
+    handler = type('DatasetApiHandler', (ApiHandler,), {'dataset_dir': dataset_dir})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the page aggregations as JSON.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on.")
+    parser.add_argument('--port', type=int, default=8600, help="Port to listen on.")
+    args = parser.parse_args()
+    server = serve((Path().resolve() / "data").absolute().as_posix(), args.host, args.port)
+    print(f"Serving the rail aggregations on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
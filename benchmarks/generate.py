@@ -0,0 +1,117 @@
+"""Generate synthetic source csv files in the schema of the IBB rail systems dataset.
+
+The rows follow the lines and stations of lines_stations_orders.json, with
+skewed line, station and age group shares, latin-1 encoded Turkish letters,
+the dirty station name suffixes of text_processing and a few rows without
+station names or coordinates. Files are written in chunks, so the row
+count is not limited by memory.
+
+    python -m benchmarks.generate --rows 1000000 --out bench_data/raw --files 12
+"""
+
+import argparse
+import calendar
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import text_processing as txt
+
+ORDERS_PATH = Path(__file__).resolve().parent.parent / "data" / "lines_stations_orders.json"
+AGES = ['0-20', '20-30', '30-60', '60+', 'Bilinmiyor']
+AGE_WEIGHTS = [0.18, 0.32, 0.38, 0.09, 0.03]
+TOWNS = ['Sisli', 'Kadiköy', 'Besiktas', 'Eyüpsultan', 'Fatih', 'Üsküdar',
+         'Bakirköy', 'Basaksehir', 'Beyoglu', 'Bagcilar']
+# Share of rows with a dirty station name suffix, without a station name,
+# and of stations without coordinates
+DIRTY_SHARE = 0.3
+NULL_STATION_SHARE = 0.001
+MISSING_COORDINATES_SHARE = 0.02
+CHUNK_ROWS = 1_000_000
+# Turkish letters as they appear in the latin-1 source file
+ENCODE_TABLE = str.maketrans({'ğ': 'ð', 'ş': 'þ', 'ı': 'ý', 'İ': 'Ý', 'Ş': 'Þ', 'Ğ': 'Ð'})
+
+
+def station_table(stations_orders: dict, rng: np.random.Generator):
+    """Build the stations of every line with their row share and attributes."""
+    # A few busy lines and a long tail of quiet ones
+    line_weights = 1 / np.arange(1, len(stations_orders['line']) + 1)
+    rng.shuffle(line_weights)
+    frames = []
+    for line, stations, line_weight in zip(stations_orders['line'], stations_orders['stations'],
+                                           line_weights):
+        station_weights = rng.lognormal(0, 0.8, len(stations))
+        missing = rng.random(len(stations)) < MISSING_COORDINATES_SHARE
+        frames.append(pd.DataFrame({
+            'line': line,
+            'station_name': [station.translate(ENCODE_TABLE) for station in stations],
+            'station_number': rng.integers(1, 1000, len(stations)),
+            'town': rng.choice(TOWNS, len(stations)),
+            'latitude': np.where(missing, np.nan, rng.uniform(40.85, 41.25, len(stations)).round(5)),
+            'longitude': np.where(missing, np.nan, rng.uniform(28.6, 29.4, len(stations)).round(5)),
+            'weight': line_weight * station_weights / station_weights.sum()}))
+    table = pd.concat(frames, ignore_index=True)
+    table['weight'] /= table['weight'].sum()
+    return table
+
+
+def generate_chunk(table: pd.DataFrame, rows: int, months: list, year: int,
+                   rng: np.random.Generator):
+    """Generate rows of random station days of the given months."""
+    chunk = table.iloc[rng.choice(len(table), rows, p=table['weight'])].reset_index(drop=True)
+    chunk = chunk.drop(columns='weight')
+    names = chunk['station_name'].to_numpy(dtype=object)
+    dirty = rng.random(rows) < DIRTY_SHARE
+    suffixes = np.array(txt.words_to_remove, dtype=object)
+    names[dirty] = names[dirty] + suffixes[rng.integers(0, len(suffixes), dirty.sum())]
+    names[rng.random(rows) < NULL_STATION_SHARE] = None
+    chunk['station_name'] = names
+    month = rng.choice(months, rows)
+    days_in_month = np.array([calendar.monthrange(year, m)[1] for m in range(1, 13)])
+    day = (rng.random(rows) * days_in_month[month - 1]).astype('int64') + 1
+    passanger_cnt = np.maximum(rng.lognormal(5, 1.2, rows).astype('int64'), 1)
+    chunk.insert(0, 'transaction_year', year)
+    chunk.insert(1, 'transaction_month', month)
+    chunk.insert(2, 'transaction_day', day)
+    chunk['age'] = rng.choice(AGES, rows, p=AGE_WEIGHTS)
+    chunk['passage_cnt'] = (passanger_cnt * rng.uniform(1, 1.6, rows)).astype('int64')
+    chunk['passanger_cnt'] = passanger_cnt
+    return chunk[['transaction_year', 'transaction_month', 'transaction_day', 'line',
+                  'station_name', 'station_number', 'town', 'age', 'passage_cnt',
+                  'passanger_cnt', 'latitude', 'longitude']]
+
+
+def generate(rows: int, out_dir: str, files: int = 1, year: int = 2022, seed: int = 0,
+             orders_path: str = ORDERS_PATH):
+    """Write the given number of rows as source csv files, splitting the months among the files.
+
+    Returns the paths of the written files.
+    """
+    rng = np.random.default_rng(seed)
+    with open(orders_path, encoding='utf-8') as file:
+        table = station_table(json.load(file), rng)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index, months in enumerate(np.array_split(np.arange(1, 13), files)):
+        path = f"{out_dir}/{year}_{index + 1:02d}.csv"
+        file_rows = rows // files + (index < rows % files)
+        for start in range(0, max(file_rows, 1), CHUNK_ROWS):
+            chunk = generate_chunk(table, min(CHUNK_ROWS, file_rows - start), months, year, rng)
+            chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0,
+                         index=False, encoding='latin-1', errors='replace')
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic rail systems source files.")
+    parser.add_argument('--rows', type=int, default=100_000, help="Total number of rows.")
+    parser.add_argument('--out', default="bench_data/raw", help="Output directory.")
+    parser.add_argument('--files', type=int, default=1,
+                        help="Number of files, each holding a share of the months.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+    for path in generate(args.rows, args.out, files=args.files, seed=args.seed):
+        print(path)
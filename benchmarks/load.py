@@ -0,0 +1,169 @@
+"""Replay scripted dashboard sessions in parallel and report the rerun latencies.
+
+Every simulated session opens a page with Streamlit's AppTest and replays
+the interactions of a visitor: switch the line, change the month, pick a
+holiday, change the age group and pick a week.
+
+With --threads every session runs in its own thread of this process, like
+the sessions of a Streamlit server. They share the caches and the locks
+and contend for the GIL, so this is the mode that measures concurrency.
+Otherwise the sessions are spread over a pool of worker processes, where
+each worker runs its sessions one after another and keeps its caches
+between them. That measures the latency of isolated sessions, not
+concurrent ones. Run it from the repository root, where the pages find
+the data directory.
+
+    python -m benchmarks.load --sessions 8 --threads --rounds 3
+    python -m benchmarks.load --sessions 16 --workers 4 --rounds 3
+    python -m benchmarks.load --sessions 16 --output load.json --compare previous.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import instrumentation as instrument
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ['passangers.py', 'pages/journeys.py']
+# The select boxes changed by a visitor, in order, after opening the page
+SCRIPT = ['Select Line', 'Select Month', 'Select Public Holiday', 'Select Age Group',
+          'Select Month for Week', 'Select Week']
+PERCENTILES = [50, 95, 99]
+TIMEOUT = 120
+
+
+def select(app, label: str, choice: int):
+    """Select an option of the select box with the given label and rerun the page."""
+    selectbox = next(selectbox for selectbox in app.selectbox if selectbox.label == label)
+    selectbox.select_index(choice % len(selectbox.options)).run()
+
+
+def run_session(page: str, session: int, rounds: int):
+    """Open a page and replay the script in this process.
+
+    Returns the timing of every rerun with the pid and the peak memory of
+    the process.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.setdefault('LOTTIE_FETCH', '0')
+    timings = []
+
+    def timed(step: str, action):
+        started = time.perf_counter()
+        action()
+        timings.append({'page': page, 'session': session, 'step': step,
+                        'seconds': time.perf_counter() - started,
+                        'error': bool(len(app.exception))})
+
+    app = AppTest.from_file(str(ROOT / page), default_timeout=TIMEOUT)
+    timed('open', app.run)
+    for round_number in range(rounds):
+        for label in SCRIPT:
+            if app.exception:
+                break
+            # Sessions and rounds pick different options, like different visitors
+            timed(label, lambda: select(app, label, session + round_number + 1))
+    return {'pid': os.getpid(),
+            'peak_rss_mb': round(instrument.peak_rss_mb(), 1),
+            'timings': timings}
+
+
+def latency_summary(seconds: list):
+    """Return the count and the percentiles of rerun latencies in milliseconds."""
+    summary = {'reruns': len(seconds)}
+    for percentile, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = round(float(value) * 1000, 1)
+    return summary
+
+
+def run(sessions: int, workers: int = None, rounds: int = 1, pages: list = PAGES,
+        threads: bool = False):
+    """Run the sessions and summarize the latencies.
+
+    The sessions run concurrently as threads of this process, or else in a
+    pool of worker processes.
+    """
+    workers = min(workers or sessions, sessions)
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=sessions) if threads else ProcessPoolExecutor(
+        max_workers=workers)
+    with pool as executor:
+        results = list(executor.map(run_session,
+                                    [pages[session % len(pages)] for session in range(sessions)],
+                                    range(sessions), [rounds] * sessions))
+    elapsed = time.perf_counter() - started
+    timings = [timing for result in results for timing in result['timings']]
+    peak_rss = {}
+    for result in results:
+        peak_rss[result['pid']] = max(peak_rss.get(result['pid'], 0), result['peak_rss_mb'])
+    steps = {}
+    for timing in timings:
+        steps.setdefault(f"{timing['page']} {timing['step']}", []).append(timing['seconds'])
+    return {'sessions': sessions,
+            'mode': 'threads' if threads else 'processes',
+            'workers': len(peak_rss),
+            'rounds': rounds,
+            'seconds': round(elapsed, 2),
+            'reruns_per_second': round(len(timings) / elapsed, 2),
+            'errors': sum(timing['error'] for timing in timings),
+            'latency': latency_summary([timing['seconds'] for timing in timings]),
+            'steps': {step: latency_summary(seconds) for step, seconds in steps.items()},
+            'worker_peak_rss_mb': sorted(peak_rss.values())}
+
+
+def print_report(report: dict, previous: dict = None):
+    """Print the latencies of a run next to the ones of a previous run."""
+    where = ("concurrent threads of one process" if report.get('mode') == 'threads'
+             else f"{report['workers']} worker processes, one at a time per worker")
+    print(f"{report['sessions']} sessions as {where}, "
+          f"{report['latency']['reruns']} reruns in {report['seconds']} s "
+          f"({report['reruns_per_second']} reruns/s, {report['errors']} with errors)")
+    print(f"peak RSS per process (MB): {report['worker_peak_rss_mb']}")
+    print(f"{'step':<48}" + ''.join(f"{f'p{percentile} ms':>10}" for percentile in PERCENTILES)
+          + (f"{'p95 before':>12}" if previous else ''))
+    rows = [('all', report['latency'], (previous or {}).get('latency'))]
+    rows += [(step, summary, (previous or {}).get('steps', {}).get(step))
+             for step, summary in report['steps'].items()]
+    for step, summary, before in rows:
+        print(f"{step:<48}" + ''.join(f"{summary[f'p{percentile}_ms']:>10.0f}"
+                                      for percentile in PERCENTILES)
+              + (f"{before['p95_ms'] if before else float('nan'):>12.0f}" if previous else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the dashboard pages with AppTest.")
+    parser.add_argument('--sessions', type=int, default=8, help="Number of simulated sessions.")
+    parser.add_argument('--threads', action='store_true',
+                        help="Run the sessions concurrently as threads of one process, "
+                             "sharing its caches like a Streamlit server.")
+    parser.add_argument('--workers', type=int,
+                        help="Number of worker processes without --threads "
+                             "(default: one per session).")
+    parser.add_argument('--rounds', type=int, default=2,
+                        help="Times each session replays the interaction script.")
+    parser.add_argument('--page', action='append', choices=PAGES,
+                        help="Page to load test, repeat for several (default: both).")
+    parser.add_argument('--output', help="Save the results to this json file.")
+    parser.add_argument('--compare', help="Show the p95 latencies of an earlier results file.")
+    args = parser.parse_args()
+
+    # AppTest replaces the __main__ module of a worker process, so the workers
+    # must find the session function under the module name
+    from benchmarks import load
+
+    report = load.run(args.sessions, args.workers, args.rounds, args.page or PAGES,
+                      threads=args.threads)
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, previous)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved the results to {args.output}.")
+    sys.exit(1 if report['errors'] else 0)
@@ -0,0 +1,179 @@
+"""Time the ETL stages and the page sections on a synthetic dataset.
+
+The timings, the peak memory and a few result checks are compared with the
+baseline stored for the same rows, files and seed in benchmarks/baseline.json.
+
+    python -m benchmarks.run --rows 100000
+    python -m benchmarks.run --rows 100000 --save-baseline
+    python -m benchmarks.run --rows 100000 --backend duckdb
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import aggregations as aggs
+import charts
+import data_access as access
+import data_processing as process
+import instrumentation as instrument
+import pipeline
+import rollups
+import text_processing as txt
+from benchmarks import generate
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# Timings slower than the baseline by more than this share are reported as regressions
+TOLERANCE = 0.2
+
+
+def record(results: dict, stage: str, seconds: float):
+    """Add the seconds of a stage to the results with the peak memory so far."""
+    entry = results.setdefault(stage, {'seconds': 0.0})
+    entry['seconds'] += seconds
+    entry['peak_rss_mb'] = round(instrument.peak_rss_mb(), 1)
+
+
+def time_etl_stages(sources: list, chunksize: int, results: dict):
+    """Time reading, text processing, data processing and the cube of every chunk."""
+    name_mapping = None
+    for source in sources:
+        reader = pd.read_csv(source, chunksize=chunksize, **pipeline.SOURCE_OPTIONS)
+        while True:
+            started = time.perf_counter()
+            chunk = next(reader, None)
+            record(results, 'etl.read', time.perf_counter() - started)
+            if chunk is None:
+                break
+            started = time.perf_counter()
+            name_mapping = txt.build_name_mapping(chunk, name_mapping)
+            chunk = txt.text_processing(chunk, name_mapping)
+            record(results, 'etl.text_processing', time.perf_counter() - started)
+            started = time.perf_counter()
+            chunk = process.data_processing(chunk, verbose=False)
+            record(results, 'etl.data_processing', time.perf_counter() - started)
+            started = time.perf_counter()
+            rollups.build_cube(chunk)
+            record(results, 'etl.cube', time.perf_counter() - started)
+
+
+def time_page_sections(dataset_dir: str, results: dict):
+    """Time the aggregations of every line and the figures of every page section."""
+    access.clear_cache()
+    holiday_dates = access.load_holiday_dates(dataset_dir)
+    for entry in access.load_manifest(dataset_dir)['lines']:
+        started = time.perf_counter()
+        line_aggs = aggs.compute_line_aggregations(dataset_dir, entry['line'])
+        record(results, 'page.aggregations', time.perf_counter() - started)
+        for page_name, (metric, label) in charts.PAGES.items():
+            for section, selection in charts.default_selections(line_aggs, page_name,
+                                                                holiday_dates).items():
+                started = time.perf_counter()
+                charts.SECTIONS[section](line_aggs, metric, label, selection).to_json()
+                record(results, f'page.{section}', time.perf_counter() - started)
+
+
+def result_checks(dataset_dir: str):
+    """Summarize the build outputs, to detect changed results between runs."""
+    kpi = access.load_rollup(dataset_dir, 'kpi')
+    manifest = access.load_manifest(dataset_dir)
+    return {'processed_rows': sum(entry['rows'] for entry in manifest['lines']),
+            'lines': len(manifest['lines']),
+            'stations': int(access.load_rollup(dataset_dir, 'monthly')['station_name'].nunique()),
+            'records': int(kpi.loc[kpi['metric'] == 'passanger_cnt', 'records'].sum()),
+            'passanger_total': int(kpi.loc[kpi['metric'] == 'passanger_cnt', 'total'].sum()),
+            'passage_total': int(kpi.loc[kpi['metric'] == 'passage_cnt', 'total'].sum()),
+            'kpi_extremes_rows': len(access.load_rollup(dataset_dir, 'kpi_extremes'))}
+
+
+def run(rows: int, work_dir: str, files: int = 1, chunksize: int = None, seed: int = 0):
+    """Generate a dataset, build it and time every stage and page section."""
+    results = {}
+    started = time.perf_counter()
+    sources = generate.generate(rows, f"{work_dir}/raw", files=files, seed=seed)
+    record(results, 'generate', time.perf_counter() - started)
+    dataset_dir = f"{work_dir}/data"
+    Path(dataset_dir).mkdir(parents=True, exist_ok=True)
+    shutil.copy(generate.ORDERS_PATH, dataset_dir)
+
+    # Stream the build like the timed stages, so any row count fits in memory
+    chunksize = chunksize or generate.CHUNK_ROWS
+    time_etl_stages(sources, chunksize, results)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline.build(sources, dataset_dir, chunksize=chunksize, full=True)
+    record(results, 'etl.build', time.perf_counter() - started)
+    time_page_sections(dataset_dir, results)
+    for entry in results.values():
+        entry['seconds'] = round(entry['seconds'], 4)
+    return {'rows': rows, 'files': files, 'seed': seed,
+            'stages': results, 'checks': result_checks(dataset_dir)}
+
+
+def baseline_key(rows: int, files: int, seed: int):
+    """Return the key of the baseline of a dataset, runs of the same key build the same data."""
+    return f"rows={rows},files={files},seed={seed}"
+
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE):
+    """Print the timings next to the baseline and return whether the results match."""
+    print(f"{'stage':<32}{'seconds':>10}{'baseline':>10}{'ratio':>8}{'peak MB':>10}")
+    for stage, entry in report['stages'].items():
+        base = baseline.get('stages', {}).get(stage) if baseline else None
+        ratio = entry['seconds'] / base['seconds'] if base and base['seconds'] else None
+        flag = '  slower' if ratio is not None and ratio > 1 + tolerance else ''
+        print(f"{stage:<32}{entry['seconds']:>10.3f}"
+              f"{base['seconds'] if base else float('nan'):>10.3f}"
+              f"{ratio if ratio is not None else float('nan'):>8.2f}"
+              f"{entry['peak_rss_mb']:>10.0f}{flag}")
+    if not baseline:
+        print("No baseline for this dataset, run with --save-baseline to store one.")
+        return True
+    if baseline['checks'] != report['checks']:
+        print("Results differ from the baseline:")
+        for name, value in report['checks'].items():
+            if baseline['checks'].get(name) != value:
+                print(f"  {name}: {value} (baseline {baseline['checks'].get(name)})")
+        return False
+    print("Results match the baseline.")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the ETL and the page sections.")
+    parser.add_argument('--rows', type=int, default=100_000,
+                        help="Number of synthetic rows, from 10^5 up to 10^8.")
+    parser.add_argument('--files', type=int, default=1,
+                        help="Number of source files the rows are split into.")
+    parser.add_argument('--chunksize', type=int,
+                        help="Stream the build in chunks of this many rows "
+                             "(default: the chunk size of the generator).")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the generator.")
+    parser.add_argument('--backend', choices=aggs.BACKENDS, default=aggs.BACKEND,
+                        help="Query backend of the page aggregations.")
+    parser.add_argument('--work-dir', help="Keep the generated files in this directory.")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store this run as the baseline for its dataset.")
+    args = parser.parse_args()
+    aggs.BACKEND = args.backend
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        report = run(args.rows, work_dir, files=args.files, chunksize=args.chunksize,
+                     seed=args.seed)
+    key = baseline_key(args.rows, args.files, args.seed)
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if args.save_baseline:
+        baselines[key] = report
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Saved the baseline for {key}.")
+    matched = compare(report, baselines.get(key))
+    sys.exit(0 if matched else 1)
@@ -0,0 +1,126 @@
+"""This module records fingerprints of the ETL source files and derived artifacts."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+import data_storage as storage
+
+BUILD_MANIFEST_NAME = "build_manifest.json"
+# Increase when the layout or the columns of the derived files change,
+# so that the next build starts over instead of merging with old outputs
+BUILD_VERSION = 7
+
+
+def count_rows(path: str):
+    """Return the number of data rows of a parquet or csv file, None for other files."""
+    if path.endswith('.parquet'):
+        return pq.ParquetFile(path).metadata.num_rows
+    if path.endswith('.csv'):
+        with open(path, 'rb') as file:
+            lines = sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 20), b''))
+        return max(lines - 1, 0)
+    return None
+
+
+def fingerprint(path: str, previous: dict = None):
+    """Return the content hash, size, mtime and row count of a file.
+
+    The hash and the row count are reused from the previous fingerprint
+    when the size and mtime of the file did not change.
+    """
+    stat = os.stat(path)
+    if (previous is not None and previous['size'] == stat.st_size
+            and previous['mtime'] == stat.st_mtime_ns):
+        return previous
+    return {'hash': storage.file_hash(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'rows': count_rows(path)}
+
+
+def source_name(source: str):
+    """Return the name identifying a source file in the outputs.
+
+    The file name is followed by a short hash of the resolved path, so files
+    with the same name in different directories get different names.
+    """
+    path = Path(source).resolve()
+    return f"{path.stem}_{hashlib.blake2b(str(path).encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def source_names(sources: list):
+    """Return the source files by their names, failing when a file is given twice."""
+    names = {}
+    for source in sources:
+        name = source_name(source)
+        if name in names:
+            raise ValueError(f"The source file {source} is given twice, also as {names[name]}")
+        names[name] = source
+    return names
+
+
+def artifact_paths(dataset_dir: str):
+    """Return the paths of every file derived from the source files."""
+    paths = [f"{dataset_dir}/tr_holidays.csv",
+             f"{dataset_dir}/{storage.NAME_MAPPING_NAME}.csv",
+             f"{dataset_dir}/{storage.PROCESSED_DATA_NAME}.csv",
+             f"{dataset_dir}/{storage.DATE_DIMENSION_NAME}.parquet",
+             f"{dataset_dir}/{storage.QUALITY_REPORT_NAME}",
+             storage.manifest_path(dataset_dir)]
+    paths += [str(path) for path in Path(f"{dataset_dir}/{storage.PROCESSED_DATA_NAME}").glob('*/*.parquet')]
+    paths += [str(path) for path in Path(f"{dataset_dir}/rollups").glob('**/*.parquet')]
+    return sorted(path for path in paths if Path(path).exists())
+
+
+def read_build_manifest(dataset_dir: str):
+    """Read the build manifest, empty if nothing was built yet."""
+    path = Path(f"{dataset_dir}/{BUILD_MANIFEST_NAME}")
+    if not path.exists():
+        return {'version': BUILD_VERSION, 'sources': {}, 'artifacts': {}}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_build_manifest(build_manifest: dict, dataset_dir: str):
+    """Save the build manifest."""
+    with open(f"{dataset_dir}/{BUILD_MANIFEST_NAME}", 'w', encoding='utf-8') as file:
+        json.dump(build_manifest, file, indent=2, sort_keys=True)
+
+
+def record_artifacts(build_manifest: dict, dataset_dir: str):
+    """Fingerprint every derived artifact in the build manifest."""
+    previous = build_manifest.get('artifacts', {})
+    build_manifest['artifacts'] = {path: fingerprint(path, previous.get(path))
+                                   for path in artifact_paths(dataset_dir)}
+    return build_manifest
+
+
+def artifacts_intact(build_manifest: dict):
+    """Check that every recorded artifact still exists with the recorded content."""
+    if build_manifest.get('version') != BUILD_VERSION:
+        return False
+    for path, recorded in build_manifest.get('artifacts', {}).items():
+        if not Path(path).exists() or fingerprint(path, recorded)['hash'] != recorded['hash']:
+            return False
+    return bool(build_manifest.get('artifacts'))
+
+
+def changed_sources(sources: list, build_manifest: dict):
+    """Return the source files which are new or changed since the last build."""
+    recorded = build_manifest.get('sources', {})
+    changed = []
+    for name, source in source_names(sources).items():
+        previous = recorded.get(name)
+        if previous is None or fingerprint(source, previous)['hash'] != previous['hash']:
+            changed.append(source)
+    return changed
+
+
+def removed_sources(sources: list, build_manifest: dict):
+    """Return the names of the recorded source files which are no longer built."""
+    names = source_names(sources)
+    return sorted(name for name in build_manifest.get('sources', {}) if name not in names)
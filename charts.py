@@ -0,0 +1,139 @@
+"""This module draws the figures of the passengers and journeys pages.
+
+Each section figure is built from the line aggregations and a widget
+selection, and served from the shared figure cache.
+"""
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+import aggregations as aggs
+import figure_cache as figures
+import instrumentation as instrument
+
+# Metric and axis label of each page
+PAGES = {'passangers': ('passanger_cnt', 'Passanger'),
+         'journeys': ('passage_cnt', 'Journey')}
+
+
+def map_figure(line_aggs: dict, metric: str, label: str, selection=None):
+    """Draw the stations of the line and the line itself on a map."""
+    geometry = line_aggs['geometry']
+    filtered_map_df = geometry[~geometry['missing']].astype({'station_name': str})
+    fig_map = px.scatter_mapbox(filtered_map_df,
+                                lat='latitude',
+                                lon='longitude',
+                                color='station_name',
+                                zoom=10,
+                                mapbox_style="carto-positron",
+                                )
+    fig_map.update_traces(marker={'size': 15})
+    fig_map.update_layout(
+        margin=dict(l=20, r=20, t=15, b=20))
+    fig_map.add_trace(go.Scattermapbox(
+        mode = "lines",
+        lon = filtered_map_df['longitude'],
+        lat = filtered_map_df['latitude'],
+        showlegend=False,
+        hoverinfo='skip'
+    ))
+    return fig_map
+
+
+def stations_by_month_figure(line_aggs: dict, metric: str, label: str, month):
+    """Draw the counts of the stations in a month."""
+    monthly = line_aggs['monthly']
+    fig = px.bar(monthly[monthly['month'] == month],
+                 x='station_name',
+                 y=metric,
+                 color_discrete_sequence=['rgb(57,105,172)'])
+    fig.update_layout(xaxis_title='Stations',
+                      yaxis_title=f'{label} Counts')
+    return fig
+
+
+def stations_on_holiday_figure(line_aggs: dict, metric: str, label: str, holiday_date):
+    """Draw the counts of the stations on a public holiday."""
+    holiday_cnt, _, _ = aggs.holiday_stations(line_aggs, metric, holiday_date)
+    fig = px.bar(holiday_cnt,
+                 x='station_name',
+                 y=metric,
+                 color_discrete_sequence=['rgb(15,133,84)'])
+    fig.update_layout(xaxis_title='Stations',
+                      yaxis_title=f'{label} Counts')
+    return fig
+
+
+def stations_by_age_group_figure(line_aggs: dict, metric: str, label: str, age_group):
+    """Draw the counts of the stations for an age group."""
+    age_station = line_aggs['age_station']
+    fig = px.bar(age_station[age_station['age'] == age_group],
+                 x='station_name',
+                 y=metric,
+                 color_discrete_sequence=['#924F4F'])
+    fig.update_layout(xaxis_title='Stations',
+                      yaxis_title=f'{label} Counts')
+    return fig
+
+
+def age_groups_figure(line_aggs: dict, metric: str, label: str, selection=None):
+    """Draw the shares of the age groups in a pie chart."""
+    age_frame = line_aggs['age'][[metric]].sort_values(metric)
+    fig = px.pie(age_frame,
+                 names=age_frame.index,
+                 values=metric,
+                 color_discrete_sequence=px.colors.sequential.RdBu)
+    fig.update_layout(margin=dict(t=0, b=0, l=80, r=0), legend_font_size=15)
+    fig.update_traces(textfont_size=15)
+    return fig
+
+
+def days_of_week_figure(line_aggs: dict, metric: str, label: str, month_and_week: tuple):
+    """Draw the daily counts of the stations in a week of a month."""
+    week_psg_cnt = aggs.week_stations(line_aggs, metric, *month_and_week)
+    min_date = week_psg_cnt['date'].min().strftime('%Y-%m-%d')
+    max_date = week_psg_cnt['date'].max().strftime('%Y-%m-%d')
+    fig = px.bar(week_psg_cnt,
+                 x=metric,
+                 y='station_name',
+                 color='day_of_week',
+                 orientation='h',
+                 height=800,
+                 title=f'Number of {label}s for Each Day for Week ({min_date} - {max_date}) by Stations')
+    fig.update_layout(xaxis_title='Stations',
+                      yaxis_title=f'{label} Counts')
+    return fig
+
+
+SECTIONS = {'map': map_figure,
+            'stations_by_month': stations_by_month_figure,
+            'stations_on_holiday': stations_on_holiday_figure,
+            'stations_by_age_group': stations_by_age_group_figure,
+            'age_groups': age_groups_figure,
+            'days_of_week': days_of_week_figure}
+
+
+def section_figure(page_name: str, section: str, line_aggs: dict, selection=None):
+    """Return the cached figure of a section for a page, line and selection, do not modify it."""
+    metric, label = PAGES[page_name]
+
+    def build():
+        with instrument.measure(f'figure.{section}', page=page_name, line=line_aggs['line']):
+            return SECTIONS[section](line_aggs, metric, label, selection)
+    return figures.cached_figure((page_name, line_aggs['line'], section, selection), build,
+                                 version=line_aggs['version'])
+
+
+def default_selections(line_aggs: dict, page_name: str, holiday_dates):
+    """Return the selection each section of a page shows before any widget change."""
+    metric, _ = PAGES[page_name]
+    age_groups = line_aggs['age'][[metric]].sort_values(metric).index
+    selections = {'map': None,
+                  'stations_by_month': line_aggs['months'][0],
+                  'stations_by_age_group': age_groups[min(3, len(age_groups) - 1)],
+                  'age_groups': None,
+                  'days_of_week': (line_aggs['months'][0],
+                                   line_aggs['daily']['week_number'].unique()[0])}
+    if len(holiday_dates):
+        selections['stations_on_holiday'] = holiday_dates.iloc[0]
+    return selections
@@ -0,0 +1,132 @@
+"""This module is the shared data access layer of the app pages.
+
+Each dataset is loaded once per server process and the same frame is
+served to every session. The frames are shared, so callers must not
+modify them in place.
+"""
+
+import os
+import threading
+
+import pandas as pd
+
+import data_processing as process
+import instrumentation as instrument
+import data_storage as storage
+
+_cache = {}
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+# One lock per cached value, so different values load concurrently
+_key_locks = {}
+
+
+def cached_load(path: str, loader, key=None):
+    """Load a file with the given loader, reusing the loaded value until the file changes.
+
+    A file is considered changed when its mtime or size differs and its
+    content hash differs too, so touching a file does not reload it.
+    Concurrent calls for the same value wait for a single load.
+    """
+    cache_key = (path, key)
+    with _lock:
+        key_lock = _key_locks.setdefault(cache_key, threading.Lock())
+    with key_lock:
+        stat = os.stat(path)
+        with _lock:
+            entry = _cache.get(cache_key)
+            if entry is not None and entry['mtime'] == (stat.st_mtime_ns, stat.st_size):
+                _stats['hits'] += 1
+                return entry['value']
+        content_hash = storage.file_hash(path)
+        if entry is not None and entry['hash'] == content_hash:
+            with _lock:
+                entry['mtime'] = (stat.st_mtime_ns, stat.st_size)
+                _stats['hits'] += 1
+            return entry['value']
+        with instrument.measure('load', path=os.path.basename(path), key=str(key)) as sample:
+            value = loader()
+            if hasattr(value, '__len__'):
+                sample['rows'] = len(value)
+        with _lock:
+            _stats['misses'] += 1
+            _cache[cache_key] = {'mtime': (stat.st_mtime_ns, stat.st_size),
+                                 'hash': content_hash,
+                                 'value': value}
+        return value
+
+
+def cache_stats():
+    """Return hit and miss counts of the data cache."""
+    with _lock:
+        return {'hits': _stats['hits'],
+                'misses': _stats['misses'],
+                'entries': len(_cache)}
+
+
+def clear_cache():
+    """Drop every cached dataset and reset the counters."""
+    with _lock:
+        _cache.clear()
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+
+
+def load_manifest(dataset_dir: str):
+    """Load the manifest listing the rail lines, their row counts and station orders."""
+    return cached_load(storage.manifest_path(dataset_dir),
+                       lambda: storage.read_manifest(dataset_dir),
+                       key='manifest')
+
+
+def load_holiday_dates(dataset_dir: str):
+    """Load the dates of the public holidays in the data, indexed by their label.
+
+    The label is the holiday name, followed by its year when the data
+    spans several years.
+    """
+    path = f"{dataset_dir}/{storage.DATE_DIMENSION_NAME}.parquet"
+
+    def load():
+        dimension = storage.read_date_dimension(dataset_dir)
+        holidays = dimension[dimension['is_holiday']]
+        labels = holidays['holiday'].astype(str)
+        if dimension['year'].nunique() > 1:
+            labels = labels + ' ' + holidays['year'].astype(str)
+        return pd.Series(holidays['date'].to_numpy(), index=labels.to_numpy(), name='date')
+    return cached_load(path, load, key='holiday_dates')
+
+
+def load_stations_orders(dataset_dir: str):
+    """Load the ordered station lists of the rail lines."""
+    path = f"{dataset_dir}/lines_stations_orders.json"
+    return cached_load(path, lambda: pd.read_json(path))
+
+
+def load_rollup(dataset_dir: str, name: str):
+    """Load a pre-aggregated rollup written by the ETL."""
+    path = f"{dataset_dir}/rollups/{name}.parquet"
+    return cached_load(path,
+                       lambda: process.optimize_dtypes(storage.read_rollup(dataset_dir, name)))
+
+
+def load_line_rollups(dataset_dir: str, name: str):
+    """Load a pre-aggregated rollup split into one frame per line.
+
+    The rollup is split once per version of its file. The empty frame of
+    a line without rows is kept under None.
+    """
+    path = f"{dataset_dir}/rollups/{name}.parquet"
+
+    def load():
+        rollup = process.optimize_dtypes(storage.read_rollup(dataset_dir, name))
+        frames = dict(list(rollup.groupby('line', observed=True, sort=False)))
+        frames[None] = rollup.iloc[:0]
+        return frames
+    return cached_load(path, load, key='by_line')
+
+
+def line_rollup(dataset_dir: str, name: str, line: str):
+    """Return the rows of a rollup belonging to the given line."""
+    frames = load_line_rollups(dataset_dir, name)
+    return frames.get(line, frames[None])
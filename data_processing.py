@@ -1,45 +1,195 @@
 "This module contains data cleaning and date processing."
 
+import calendar
+
 import pandas as pd
 import numpy as np
 
+import tr_holidays as holiday
+
+MONTH_NAMES = list(calendar.month_name)[1:]
+DAY_NAMES = list(calendar.day_name)
+
+category_columns = ['line', 'station_name', 'town', 'age']
+ordered_category_columns = {'month': MONTH_NAMES, 'day_of_week': DAY_NAMES}
+integer_columns = ['year', 'day', 'station_number', 'passanger_cnt', 'passage_cnt',
+                   'week', 'week_number', 'weekend_status', 'date_key', 'working_day_index']
+
+
+def quality_counts(data: pd.DataFrame, stations_orders: dict = None):
+    """Count the data quality issues of every line in a single grouped pass.
+
+    Returns a long frame of line, check, item and count rows, summable
+    across chunks and source files: the rows of each line, the null values
+    of each column, the rows dropped for a missing station name and, per
+    station, the rows without coordinates and the rows of a station missing
+    from the stations orders.
+    """
+    line = data['line'].astype(object).fillna('')
+    missing_coordinates = data['latitude'].isna() | data['longitude'].isna()
+    by_line = data.isna().groupby(line).sum()
+    frames = [line.value_counts().rename('count').rename_axis('line').reset_index()
+              .assign(check='rows', item=''),
+              by_line.rename_axis(columns='item').stack().rename('count').reset_index()
+              .assign(check='null'),
+              by_line['station_name'].rename('count').reset_index().assign(check='dropped', item='')]
+
+    named = data['station_name'].notna()
+    by_station = (missing_coordinates[named].astype('int64')
+                  .groupby([line[named].rename('line'),
+                            data.loc[named, 'station_name'].astype(object).rename('item')])
+                  .agg(['size', 'sum']))
+    frames.append(by_station['sum'].rename('count').reset_index()
+                  .assign(check='missing_coordinates'))
+    if stations_orders is not None:
+        known = pd.MultiIndex.from_tuples([(line_name, station)
+                                           for line_name, stations in stations_orders.items()
+                                           for station in stations])
+        unknown = by_station.loc[~by_station.index.isin(known), 'size']
+        frames.append(unknown.rename('count').reset_index().assign(check='unknown_station'))
+    counts = pd.concat(frames, ignore_index=True)
+    return (counts.loc[counts['count'] > 0, ['line', 'check', 'item', 'count']]
+            .astype({'line': str, 'check': str, 'item': str, 'count': 'int64'})
+            .reset_index(drop=True))
+
+
+def combine_quality_counts(counts: list):
+    """Sum the quality counts of several chunks or source files."""
+    return (pd.concat(counts, ignore_index=True)
+            .groupby(['line', 'check', 'item'])['count'].sum().reset_index())
+
+
+def quality_report(counts: pd.DataFrame):
+    """Arrange the quality counts as totals and one entry per line.
+
+    Null values are counted per column, stations without coordinates and
+    stations missing from the stations orders per station name.
+    """
+    def entry(frame: pd.DataFrame):
+        items = {check: dict(zip(group['item'], group['count'].astype(int)))
+                 for check, group in frame.groupby('check')}
+        return {'rows': items.get('rows', {}).get('', 0),
+                'dropped_rows': items.get('dropped', {}).get('', 0),
+                'null_values': items.get('null', {}),
+                'missing_coordinates': items.get('missing_coordinates', {}),
+                'unknown_stations': items.get('unknown_station', {})}
+
+    totals = entry(counts.groupby(['check', 'item'])['count'].sum().reset_index())
+    return {'rows': totals['rows'],
+            'dropped_rows': totals['dropped_rows'],
+            'null_values': totals['null_values'],
+            'lines_with_unknown_stations': int(counts.loc[counts['check'] == 'unknown_station',
+                                                          'line'].nunique()),
+            'lines': [{'line': line, **entry(frame)}
+                      for line, frame in counts.groupby('line')]}
+
+
+def drop_null_values_line_frames(data: pd.DataFrame, verbose: bool = True):
+    """Drop rows where station name is null in data frame.
 
-def analyze_null_values_line_frames(data: pd.DataFrame):
-    """Analyze the null values in line frames"""
-    lines = (data['line'].unique()).tolist()
-    for line in lines:
-        line_frame = data[data['line'] == line]
-        if line_frame.isnull().sum().sum() > 0:
-            print(line)
-            print(line_frame.shape)
-            print(line_frame.isnull().sum())
-            
-
-def drop_null_values_line_frames(data: pd.DataFrame):
-    """Drop rows where station name is null in data frame."""
-    print("Before dropping NaN values:", data.shape)
+    The dropped rows are counted by quality_counts.
+    """
+    rows = len(data)
     data.dropna(subset=['station_name'], inplace=True)
-    print("After dropping NaN values:", data.shape)
+    if verbose:
+        print(f"Dropped {rows - len(data):,} of {rows:,} rows without a station name")
+
+
+def build_date_dimension(date_keys, holiday_frame: pd.DataFrame = None):
+    """Build the calendar attributes of the distinct dates given as yyyymmdd integer keys.
+
+    With a holidays frame the dimension also gets the holiday flag and name
+    and the index of each working day within its year (0 on other days).
+    """
+    dimension = pd.DataFrame({'date_key': np.unique(np.asarray(date_keys, dtype='int64'))})
+    dimension['date'] = pd.to_datetime(dimension['date_key'].astype(str), format='%Y%m%d')
+    dimension['year'] = dimension['date'].dt.year
+    dimension['month'] = dimension['date'].dt.month_name()
+    dimension['day'] = dimension['date'].dt.day
+    dimension['week'] = dimension['date'].dt.isocalendar().week.astype('int64')
+    dimension['week_number'] = (dimension['date'].dt.day - 1) // 7 + 1
+    dimension['day_of_week'] = dimension['date'].dt.day_name()
+    dimension['weekend_status'] = np.where(dimension['date'].dt.weekday > 4, 1, 0)
+    if holiday_frame is not None:
+        dimension['holiday'] = dimension['date'].map(holiday.holiday_lookup(holiday_frame))
+        dimension['is_holiday'] = dimension['holiday'].notna()
+        working_day = (dimension['weekend_status'] == 0) & ~dimension['is_holiday']
+        dimension['working_day_index'] = np.where(
+            working_day, working_day.astype(int).groupby(dimension['year']).cumsum(), 0)
+    return dimension
 
 
 def process_date_features(data: pd.DataFrame):
-    """Parse"""
+    """Add the date and its calendar attributes to every row.
+
+    The attributes are computed once per distinct date in a date dimension
+    and gathered onto the rows through an integer yyyymmdd date key.
+    """
     data.rename(columns={'transaction_year': 'year',
                         'transaction_month': 'month',
                         'transaction_day': 'day'}, inplace=True)
 
-    data['date'] = pd.to_datetime(data[['year', 'month', 'day']],
-                                format='%Y-%m-%d')
-    data['month'] = data['date'].dt.month_name()
-    data['week'] = data['date'].dt.isocalendar().week
-    data['week_number'] = (data['date'].dt.day - 1) // 7 + 1
-    data['day_of_week'] = data['date'].dt.day_name()
-    data['weekend_status'] =  np.where(data['date'].dt.weekday > 4, 1, 0)
+    date_key = (data['year'].astype('int64') * 10000
+                + data['month'].astype('int64') * 100
+                + data['day'].astype('int64')).to_numpy()
+    dimension = build_date_dimension(date_key)
+    rows = pd.Index(dimension['date_key']).get_indexer(date_key)
+    for column in ['date', 'month', 'week', 'week_number', 'day_of_week', 'weekend_status']:
+        data[column] = dimension[column].to_numpy()[rows]
+    data['date_key'] = date_key
     return data
 
 
-def data_processing(data: pd.DataFrame):
+def downcast_integers(values: pd.Series):
+    """Convert values to the smallest integer type that holds them.
+
+    A column with missing values gets the nullable Int type of that size,
+    so a single null does not stop the processing.
+    """
+    if values.isna().any():
+        return pd.to_numeric(values.astype('Int64'), downcast='integer')
+    return pd.to_numeric(values.astype('int64'), downcast='integer')
+
+
+def optimize_dtypes(data: pd.DataFrame):
+    """Store dimensions as categoricals and counters as the smallest safe integers.
+
+    Months and week days become ordered categoricals in calendar order.
+    Any other text column with few distinct values becomes a categorical too.
+    """
+    for column in data.columns:
+        if column in ordered_category_columns:
+            data[column] = pd.Categorical(data[column],
+                                          categories=ordered_category_columns[column],
+                                          ordered=True)
+        elif column in category_columns:
+            data[column] = data[column].astype('category')
+        elif column in integer_columns:
+            data[column] = downcast_integers(data[column])
+        elif (pd.api.types.is_string_dtype(data[column])
+              and data[column].nunique() < 0.5 * len(data)):
+            data[column] = data[column].astype('category')
+    return data
+
+
+def memory_report(data: pd.DataFrame):
+    """Return the memory usage of each column in bytes."""
+    return data.memory_usage(index=False, deep=True)
+
+
+def print_memory_report(before: pd.Series, after: pd.Series):
+    """Print the memory usage of each column before and after optimization."""
+    report = pd.DataFrame({'before': before, 'after': after})
+    report.loc['total'] = report.sum()
+    print((report / 1024 ** 2).round(2).rename(columns=lambda x: f'{x} (MB)'))
+
+
+def data_processing(data: pd.DataFrame, verbose: bool = True):
     """Apply data processing to data frame."""
-    drop_null_values_line_frames(data)
+    drop_null_values_line_frames(data, verbose=verbose)
     data = process_date_features(data)
+    before = memory_report(data) if verbose else None
+    data = optimize_dtypes(data)
+    if verbose:
+        print_memory_report(before, memory_report(data))
     return data
\ No newline at end of file
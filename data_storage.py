@@ -0,0 +1,264 @@
+"""This module handles reading and writing the processed rail systems data."""
+
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROCESSED_DATA_NAME = "processed_data_2022_rail_stations"
+NAME_MAPPING_NAME = "name_mapping"
+MANIFEST_NAME = "_manifest.json"
+DATE_DIMENSION_NAME = "date_dimension"
+QUALITY_REPORT_NAME = "data_quality.json"
+
+# Arrow fields are nullable, so the integer types also hold the nullable Int columns
+# of chunks with missing counts or station numbers
+PROCESSED_SCHEMA = {
+    'year': pa.int16(),
+    'month': pa.dictionary(pa.int32(), pa.string()),
+    'day': pa.int8(),
+    'line': pa.dictionary(pa.int32(), pa.string()),
+    'station_name': pa.dictionary(pa.int32(), pa.string()),
+    'station_number': pa.int32(),
+    'town': pa.dictionary(pa.int32(), pa.string()),
+    'age': pa.dictionary(pa.int32(), pa.string()),
+    'passage_cnt': pa.int64(),
+    'passanger_cnt': pa.int64(),
+    'latitude': pa.float64(),
+    'longitude': pa.float64(),
+    'date': pa.date32(),
+    'week': pa.int8(),
+    'week_number': pa.int8(),
+    'day_of_week': pa.dictionary(pa.int32(), pa.string()),
+    'weekend_status': pa.int8(),
+    'date_key': pa.int32(),
+}
+
+
+def processed_schema(data: pd.DataFrame):
+    """Build the arrow schema for a processed data frame.
+
+    Known columns get their explicit type, any other column is inferred.
+    Categorical columns keep their ordering with 32 bit dictionary indices,
+    so the schema fits every chunk of a streamed dataset.
+    """
+    inferred = pa.Schema.from_pandas(data, preserve_index=False)
+    fields = []
+    for field in inferred:
+        if pa.types.is_dictionary(field.type):
+            fields.append(pa.field(field.name, pa.dictionary(pa.int32(),
+                                                             field.type.value_type,
+                                                             field.type.ordered)))
+        elif field.name in PROCESSED_SCHEMA:
+            fields.append(pa.field(field.name, PROCESSED_SCHEMA[field.name]))
+        else:
+            fields.append(field)
+    return pa.schema(fields)
+
+
+def file_hash(path: str):
+    """Return the content hash of a file."""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def line_partition_name(line: str):
+    """Return the directory name of the partition of a rail line.
+
+    The readable part of the name drops punctuation, so a short hash of the
+    line name keeps lines like "A-B" and "A B" in separate directories.
+    """
+    digest = hashlib.blake2b(line.encode('utf-8'), digest_size=4).hexdigest()
+    return f"{re.sub(r'[^A-Za-z0-9]+', '_', line).strip('_')}_{digest}"
+
+
+def clear_processed_data(dataset_dir: str):
+    """Remove the line partitions and the per-source rollup inputs of earlier builds."""
+    shutil.rmtree(f"{dataset_dir}/{PROCESSED_DATA_NAME}", ignore_errors=True)
+    shutil.rmtree(f"{dataset_dir}/rollups/cubes", ignore_errors=True)
+    shutil.rmtree(f"{dataset_dir}/rollups/quality", ignore_errors=True)
+    shutil.rmtree(f"{dataset_dir}/rollups/stations", ignore_errors=True)
+
+
+def remove_source_data(dataset_dir: str, source: str):
+    """Remove the files a source file added to the line partitions and its rollup inputs."""
+    for path in Path(f"{dataset_dir}/{PROCESSED_DATA_NAME}").glob(f"*/{source}.parquet"):
+        path.unlink()
+    Path(f"{dataset_dir}/rollups/cubes/{source}.parquet").unlink(missing_ok=True)
+    Path(f"{dataset_dir}/rollups/quality/{source}.parquet").unlink(missing_ok=True)
+    Path(f"{dataset_dir}/rollups/stations/{source}.parquet").unlink(missing_ok=True)
+
+
+def write_processed_chunks(chunks, dataset_dir: str, source: str):
+    """Append processed chunks of a source file to its parquet file in every rail line partition.
+
+    Only one chunk is held in memory at a time. Returns the number of
+    rows written to each line.
+    """
+    remove_source_data(dataset_dir, source)
+    partition_dir = Path(f"{dataset_dir}/{PROCESSED_DATA_NAME}")
+    schema = None
+    writers = {}
+    rows = {}
+    try:
+        for chunk in chunks:
+            if schema is None:
+                schema = processed_schema(chunk)
+            for line, line_frame in chunk.groupby('line', observed=True, sort=False):
+                if line not in writers:
+                    line_dir = partition_dir / line_partition_name(line)
+                    line_dir.mkdir(parents=True, exist_ok=True)
+                    writers[line] = pq.ParquetWriter(line_dir / f"{source}.parquet", schema)
+                    rows[line] = 0
+                table = pa.Table.from_pandas(line_frame, schema=schema, preserve_index=False)
+                writers[line].write_table(table)
+                rows[line] += len(line_frame)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def update_manifest(dataset_dir: str, source_rows: dict, stations_orders: dict = None):
+    """Record the rows each source file wrote to each line in the manifest.
+
+    The manifest lists the lines with their partition directory, row
+    count per source file and station order.
+    """
+    stations_orders = stations_orders or {}
+    lines = {}
+    if Path(manifest_path(dataset_dir)).exists():
+        lines = {entry['line']: entry['sources'] for entry in read_manifest(dataset_dir)['lines']}
+    for source, line_rows in source_rows.items():
+        for sources in lines.values():
+            sources.pop(source, None)
+        for line, rows in line_rows.items():
+            lines.setdefault(line, {})[source] = rows
+    manifest = [{'line': line,
+                 'path': line_partition_name(line),
+                 'rows': sum(sources.values()),
+                 'sources': dict(sorted(sources.items())),
+                 'stations': stations_orders.get(line, [])}
+                for line, sources in sorted(lines.items()) if sources]
+    Path(f"{dataset_dir}/{PROCESSED_DATA_NAME}").mkdir(parents=True, exist_ok=True)
+    with open(manifest_path(dataset_dir), 'w', encoding='utf-8') as file:
+        json.dump({'lines': manifest}, file, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def export_processed_csv(dataset_dir: str):
+    """Export the processed data as csv file, one line partition file at a time."""
+    started = False
+    for entry in read_manifest(dataset_dir)['lines']:
+        for source in entry['sources']:
+            data = pq.read_table(
+                f"{dataset_dir}/{PROCESSED_DATA_NAME}/{entry['path']}/{source}.parquet"
+            ).to_pandas(date_as_object=False)
+            data.to_csv(f"{dataset_dir}/{PROCESSED_DATA_NAME}.csv",
+                        mode='a' if started else 'w',
+                        index=False,
+                        header=not started)
+            started = True
+
+
+def manifest_path(dataset_dir: str):
+    """Return the path of the manifest of the processed data."""
+    return f"{dataset_dir}/{PROCESSED_DATA_NAME}/{MANIFEST_NAME}"
+
+
+def read_manifest(dataset_dir: str):
+    """Read the manifest listing the rail line partitions."""
+    with open(manifest_path(dataset_dir), encoding='utf-8') as file:
+        return json.load(file)
+
+
+def write_rollups(rollups: dict, dataset_dir: str):
+    """Save each rollup frame as parquet file under the rollups directory."""
+    Path(f"{dataset_dir}/rollups").mkdir(exist_ok=True)
+    for name, frame in rollups.items():
+        table = pa.Table.from_pandas(frame, schema=processed_schema(frame), preserve_index=False)
+        pq.write_table(table, f"{dataset_dir}/rollups/{name}.parquet")
+
+
+def write_source_cube(cube: pd.DataFrame, dataset_dir: str, source: str):
+    """Save the cube of a single source file."""
+    Path(f"{dataset_dir}/rollups/cubes").mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(cube, schema=processed_schema(cube), preserve_index=False)
+    pq.write_table(table, f"{dataset_dir}/rollups/cubes/{source}.parquet")
+
+
+def read_source_cubes(dataset_dir: str):
+    """Read the cubes of every source file."""
+    return [pq.read_table(path).to_pandas(date_as_object=False)
+            for path in sorted(Path(f"{dataset_dir}/rollups/cubes").glob('*.parquet'))]
+
+
+def write_source_quality(counts: pd.DataFrame, dataset_dir: str, source: str):
+    """Save the data quality counts of a single source file."""
+    Path(f"{dataset_dir}/rollups/quality").mkdir(parents=True, exist_ok=True)
+    counts.to_parquet(f"{dataset_dir}/rollups/quality/{source}.parquet", index=False)
+
+
+def read_source_quality(dataset_dir: str):
+    """Read the data quality counts of every source file."""
+    return [pd.read_parquet(path)
+            for path in sorted(Path(f"{dataset_dir}/rollups/quality").glob('*.parquet'))]
+
+
+def write_source_stations(stations: pd.DataFrame, dataset_dir: str, source: str):
+    """Save the distinct station points of a single source file."""
+    Path(f"{dataset_dir}/rollups/stations").mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(stations, schema=processed_schema(stations), preserve_index=False)
+    pq.write_table(table, f"{dataset_dir}/rollups/stations/{source}.parquet")
+
+
+def read_source_stations(dataset_dir: str):
+    """Read the station points of every source file, in the order of the source names."""
+    return [pq.read_table(path).to_pandas()
+            for path in sorted(Path(f"{dataset_dir}/rollups/stations").glob('*.parquet'))]
+
+
+def write_quality_report(report: dict, dataset_dir: str):
+    """Save the data quality report as json."""
+    with open(f"{dataset_dir}/{QUALITY_REPORT_NAME}", 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def write_date_dimension(dimension: pd.DataFrame, dataset_dir: str):
+    """Save the date dimension as parquet file."""
+    table = pa.Table.from_pandas(dimension, schema=processed_schema(dimension),
+                                 preserve_index=False)
+    pq.write_table(table, f"{dataset_dir}/{DATE_DIMENSION_NAME}.parquet")
+
+
+def read_date_dimension(dataset_dir: str):
+    """Read the date dimension."""
+    return pq.read_table(f"{dataset_dir}/{DATE_DIMENSION_NAME}.parquet").to_pandas(
+        date_as_object=False)
+
+
+def read_rollup(dataset_dir: str, name: str, columns: list = None):
+    """Read a rollup frame."""
+    table = pq.read_table(f"{dataset_dir}/rollups/{name}.parquet", columns=columns)
+    return table.to_pandas(date_as_object=False)
+
+
+def write_name_mapping(name_mapping: pd.DataFrame, dataset_dir: str):
+    """Save the raw to canonical name mapping table as csv file."""
+    name_mapping.to_csv(f"{dataset_dir}/{NAME_MAPPING_NAME}.csv", index=False)
+
+
+def read_name_mapping(dataset_dir: str):
+    """Read the name mapping table, return None if it was not saved yet."""
+    path = Path(f"{dataset_dir}/{NAME_MAPPING_NAME}.csv")
+    if not path.exists():
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
@@ -0,0 +1,111 @@
+"""This module streams filtered extracts of the processed data as csv or parquet files.
+
+The rows of a line are read from its partition in record batches, with the
+date range, age group and station filters pushed down to the parquet scan
+and only the requested columns read. Each batch is written to the output
+as it arrives, so an extract is never held in memory as a frame.
+"""
+
+import datetime
+import os
+from urllib.parse import urlencode
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import data_storage as storage
+
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+EXPORT_COLUMNS = ['date', 'line', 'station_name', 'town', 'age', 'passanger_cnt', 'passage_cnt']
+BATCH_ROWS = 64 * 1024
+# The largest extract the pages offer as an in-page download, held in memory by the
+# Streamlit server. Larger extracts are streamed from the /export endpoint of api.py
+DOWNLOAD_ROWS = 1_000_000
+API_URL = os.environ.get('RAIL_API_URL', 'http://127.0.0.1:8600')
+
+
+def line_dataset(dataset_dir: str, line: str):
+    """Open the partition of a line as a parquet dataset."""
+    return ds.dataset(f"{dataset_dir}/{storage.PROCESSED_DATA_NAME}/"
+                      f"{storage.line_partition_name(line)}", format='parquet')
+
+
+def export_filter(line: str, start: datetime.date = None, end: datetime.date = None,
+                  ages: list = None, stations: list = None):
+    """Build the filter expression of a line, an inclusive date range, age groups and stations."""
+    expression = pc.field('line') == line
+    if start is not None:
+        expression &= pc.field('date') >= pa.scalar(start, pa.date32())
+    if end is not None:
+        expression &= pc.field('date') <= pa.scalar(end, pa.date32())
+    if ages:
+        expression &= pc.field('age').isin(list(ages))
+    if stations:
+        expression &= pc.field('station_name').isin(list(stations))
+    return expression
+
+
+def count_rows(dataset_dir: str, line: str, **filters):
+    """Count the rows of a filtered extract, reading only the filtered columns."""
+    return line_dataset(dataset_dir, line).count_rows(filter=export_filter(line, **filters))
+
+
+def export_url(line: str, export_format: str = 'csv', columns: list = None,
+               start: datetime.date = None, end: datetime.date = None,
+               ages: list = None, stations: list = None, api_url: str = API_URL):
+    """Return the /export URL of the API streaming the same extract."""
+    params = [('line', line), ('format', export_format)]
+    params += [(name, value.isoformat()) for name, value in (('start', start), ('end', end))
+               if value is not None]
+    params += [('age', age) for age in ages or []]
+    params += [('station', station) for station in stations or []]
+    params += [('column', column) for column in columns or []]
+    return f"{api_url}/export?{urlencode(params)}"
+
+
+def export_batches(dataset_dir: str, line: str, columns: list = None, batch_rows: int = BATCH_ROWS,
+                   **filters):
+    """Return the schema and an iterator of the record batches of a filtered extract."""
+    dataset = line_dataset(dataset_dir, line)
+    columns = columns or EXPORT_COLUMNS
+    scanner = dataset.scanner(columns=columns, filter=export_filter(line, **filters),
+                              batch_size=batch_rows)
+    return scanner.projected_schema, scanner.to_batches()
+
+
+def write_export(schema: pa.Schema, batches, sink, export_format: str = 'csv'):
+    """Write record batches to a file path or a writable file object as they arrive.
+
+    Returns the number of rows written.
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"The export format must be one of {list(FORMATS)}")
+    if export_format == 'csv':
+        writer = pcsv.CSVWriter(sink, schema)
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+    rows = 0
+    try:
+        for batch in batches:
+            if len(batch):
+                writer.write_batch(batch)
+                rows += len(batch)
+    finally:
+        writer.close()
+    return rows
+
+
+def export_line(dataset_dir: str, line: str, sink, export_format: str = 'csv',
+                columns: list = None, **filters):
+    """Stream the filtered rows of a line to a file path or a writable file object."""
+    schema, batches = export_batches(dataset_dir, line, columns=columns, **filters)
+    return write_export(schema, batches, sink, export_format)
+
+
+def preview(dataset_dir: str, line: str, rows: int = 5, columns: list = None):
+    """Read the first rows of a line, without reading the rest of its partition."""
+    return line_dataset(dataset_dir, line).head(rows, columns=columns or EXPORT_COLUMNS,
+                                                filter=export_filter(line)).to_pandas()
@@ -0,0 +1,76 @@
+"""This module caches the figures drawn on the app pages.
+
+A figure is built once for each page, line, section and widget selection,
+and the same figure object is served to every session, so callers must not
+modify it. The least recently used figures are dropped beyond the entry and
+byte limits, and a figure is rebuilt when the data version it was built
+from changes.
+"""
+
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+MAX_FIGURES = 512
+MAX_FIGURE_BYTES = 64 * 1024 * 1024
+
+_figures = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_lock = threading.Lock()
+
+
+def figure_size(figure):
+    """Return the approximate size of a figure in bytes, the length of its JSON."""
+    return len(pio.to_json(figure, validate=False))
+
+
+def cached_figure(key: tuple, build, version=None, max_figures: int = MAX_FIGURES,
+                  max_bytes: int = MAX_FIGURE_BYTES):
+    """Return the figure for a (page, line, section, selection) key.
+
+    On a miss the figure is built with the given function and kept for
+    later calls with the same key and data version.
+    """
+    with _lock:
+        entry = _figures.get(key)
+        if entry is not None and entry['version'] == version:
+            _figures.move_to_end(key)
+            _stats['hits'] += 1
+            return entry['figure']
+    figure = build()
+    size = figure_size(figure)
+    with _lock:
+        _stats['misses'] += 1
+        previous = _figures.pop(key, None)
+        if previous is not None:
+            _stats['bytes'] -= previous['bytes']
+        _figures[key] = {'version': version, 'figure': figure, 'bytes': size}
+        _stats['bytes'] += size
+        while _figures and (len(_figures) > max_figures or _stats['bytes'] > max_bytes):
+            _, evicted = _figures.popitem(last=False)
+            _stats['bytes'] -= evicted['bytes']
+            _stats['evictions'] += 1
+    return figure
+
+
+def figure_stats():
+    """Return hit, miss and eviction counts, the size and the hit rate of the figure cache."""
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {'hits': _stats['hits'],
+                'misses': _stats['misses'],
+                'evictions': _stats['evictions'],
+                'entries': len(_figures),
+                'bytes': _stats['bytes'],
+                'hit_rate': _stats['hits'] / lookups if lookups else 0.0}
+
+
+def clear_figures():
+    """Drop every cached figure and reset the counters."""
+    with _lock:
+        _figures.clear()
+        _stats['hits'] = 0
+        _stats['misses'] = 0
+        _stats['evictions'] = 0
+        _stats['bytes'] = 0
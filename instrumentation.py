@@ -0,0 +1,158 @@
+"""This module measures the wall time, rows and memory of the ETL stages and page sections.
+
+Measuring is off by default and then costs a single flag check per block.
+It is turned on with the RAIL_METRICS environment variable, set to 1 or to
+the path of a JSON lines file receiving one record per measured block, or
+with enable(). The latest records are kept in memory for the debug panel
+of the app pages.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+MAX_RECORDS = 1000
+
+_records = deque(maxlen=MAX_RECORDS)
+_lock = threading.Lock()
+_settings = {'enabled': False, 'path': None}
+
+
+def enable(path: str = None):
+    """Start measuring, appending the records to the given JSON lines file if any."""
+    _settings['enabled'] = True
+    _settings['path'] = path
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Stop measuring."""
+    _settings['enabled'] = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def enabled():
+    """Return whether measuring is on."""
+    return _settings['enabled']
+
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def emit(record: dict):
+    """Keep a record in memory and append it to the metrics file."""
+    with _lock:
+        _records.append(record)
+        if _settings['path']:
+            with open(_settings['path'], 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record, default=str) + "\n")
+
+
+def _allocated():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _record(name: str, started: float, allocated: int, fields: dict):
+    emit({'name': name,
+          'time': time.time(),
+          'pid': os.getpid(),
+          'seconds': round(time.perf_counter() - started, 6),
+          'allocated_mb': round((_allocated() - allocated) / 1024 ** 2, 3),
+          'peak_rss_mb': round(peak_rss_mb(), 1),
+          **fields})
+
+
+@contextlib.contextmanager
+def _measure(name: str, fields: dict):
+    sample = dict(fields)
+    allocated = _allocated()
+    started = time.perf_counter()
+    try:
+        yield sample
+    finally:
+        _record(name, started, allocated, sample)
+
+
+def measure(name: str, **fields):
+    """Measure a block; the yielded dict takes extra fields such as the rows processed."""
+    if not _settings['enabled']:
+        return contextlib.nullcontext({})
+    return _measure(name, fields)
+
+
+def timed(name: str):
+    """Decorate a function to measure each of its calls."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def measured(items, name: str, **fields):
+    """Yield the items of an iterator, measuring the production of each item."""
+    iterator = iter(items)
+    while True:
+        allocated = _allocated() if _settings['enabled'] else 0
+        started = time.perf_counter()
+        item = next(iterator, None)
+        if item is None:
+            return
+        if _settings['enabled']:
+            _record(name, started, allocated,
+                    {**fields, 'rows': len(item)} if hasattr(item, '__len__') else fields)
+        yield item
+
+
+def records():
+    """Return the latest records, oldest first."""
+    with _lock:
+        return list(_records)
+
+
+def summary():
+    """Return the count, total and last wall time and the last rows of each measured block."""
+    names = {}
+    for record in records():
+        entry = names.setdefault(record['name'], {'name': record['name'], 'count': 0,
+                                                  'total_seconds': 0.0})
+        entry['count'] += 1
+        entry['total_seconds'] += record['seconds']
+        entry['last_seconds'] = record['seconds']
+        entry['last_rows'] = record.get('rows')
+        entry['last_allocated_mb'] = record['allocated_mb']
+    return sorted(names.values(), key=lambda entry: entry['total_seconds'], reverse=True)
+
+
+def show_debug_panel(*stats):
+    """Show the measured blocks and the given cache statistics in the sidebar."""
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("Debug: timings", expanded=False):
+        st.dataframe(pd.DataFrame(summary()), hide_index=True)
+        for name, values in stats:
+            st.caption(name)
+            st.json(values)
+
+
+if os.environ.get('RAIL_METRICS', '0') != '0':
+    enable(None if os.environ['RAIL_METRICS'] == '1' else os.environ['RAIL_METRICS'])
@@ -1,29 +1,39 @@
 """Main Module."""
+import argparse
 from pathlib import Path
 
-import pandas as pd
-
-import text_processing as txt
-import data_processing as process
-import tr_holidays as holiday
+import instrumentation as instrument
+import pipeline
 
 dataset_dir = (Path().resolve() / "data").absolute().as_posix()
 
 if __name__ == '__main__':
-    # Read the dataset
-    data = pd.read_csv(f"{dataset_dir}/2022_rail_systems_dataset.csv",
-                       delimiter=',',
-                       encoding='latin-1')
-    # Apply text processing
-    cleaned_data = txt.text_processing(data)
-    # Apply data processing
-    processed_data = process.data_processing(cleaned_data)
-    # Save cleaned and processed data as csv file
-    processed_data.to_csv(f"{dataset_dir}/processed_data_2022_rail_stations.csv",
-                          index=False,
-                          header=True)
-    # Generate TR holidays data
-    holiday_frame = holiday.generate_holidays_data()
-    holiday_frame['Holiday'] = holiday.add_number_to_duplicates(holiday_frame['Holiday'])
-    # Save generated data as csv file
-    holiday_frame.to_csv(f"{dataset_dir}/tr_holidays.csv", index=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Process the rail systems dataset.")
+    parser.add_argument('--source', default=f"{dataset_dir}/2022_rail_systems_dataset.csv",
+                        help="Path of the raw dataset csv file, or a directory or glob "
+                             "pattern of csv files to process in parallel.")
+    parser.add_argument('--csv', action='store_true',
+                        help="Also export the processed data as csv file.")
+    parser.add_argument('--chunksize', type=int,
+                        help="Stream the dataset in chunks of this many rows "
+                             "instead of loading it into memory at once.")
+    parser.add_argument('--workers', type=int,
+                        help="Number of worker processes for many source files "
+                             "(default: number of CPUs).")
+    parser.add_argument('--full', action='store_true',
+                        help="Rebuild everything instead of only new or changed source files.")
+    parser.add_argument('--metrics',
+                        help="Append the timing, rows and memory of each ETL stage "
+                             "to this JSON lines file.")
+    args = parser.parse_args()
+    if args.metrics:
+        instrument.enable(args.metrics)
+
+    sources = pipeline.source_files(args.source)
+    if not sources:
+        parser.error(f"No source csv files found for {args.source}")
+    pipeline.build(sources, dataset_dir,
+                   chunksize=args.chunksize,
+                   workers=args.workers,
+                   csv=args.csv,
+                   full=args.full)
@@ -0,0 +1,216 @@
+"""This module runs the ETL steps from the raw dataset to the files read by the app."""
+
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import pandas as pd
+
+import build_manifest as manifest
+import instrumentation as instrument
+import text_processing as txt
+import data_processing as process
+import data_storage as storage
+import rollups
+import tr_holidays as holiday
+from instrumentation import peak_rss_mb
+
+SOURCE_OPTIONS = {'delimiter': ',', 'encoding': 'latin-1'}
+
+
+def report_progress(rows: int, started: float, label: str = None):
+    """Print the number of processed rows, the throughput and the peak memory."""
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"{label + ': ' if label else ''}{rows:,} rows processed in {elapsed:.1f} s "
+          f"({rows / elapsed:,.0f} rows/s, peak RSS {peak_rss_mb():,.0f} MB)")
+
+
+def read_stations_orders(dataset_dir: str):
+    """Read the ordered station lists as a line to stations mapping."""
+    stations_orders = pd.read_json(f"{dataset_dir}/lines_stations_orders.json")
+    return dict(zip(stations_orders['line'], stations_orders['stations']))
+
+
+def build_holidays(dataset_dir: str, years):
+    """Build the TR holidays of the given years and save them as csv file when they changed.
+
+    The calendar of each set of years is cached in the holiday_cache
+    directory. Returns the holidays frame and whether the saved file was
+    rewritten.
+    """
+    holiday_frame = holiday.holiday_calendar(years, cache_dir=f"{dataset_dir}/holiday_cache")
+    path = Path(f"{dataset_dir}/tr_holidays.csv")
+    content = holiday_frame.to_csv(index=False)
+    if path.exists() and path.read_text(encoding='utf-8') == content:
+        return holiday_frame, False
+    path.write_text(content, encoding='utf-8')
+    return holiday_frame, True
+
+
+def built_years(dataset_dir: str):
+    """Return the years of the date dimension of the last build, none before the first build."""
+    path = Path(f"{dataset_dir}/{storage.DATE_DIMENSION_NAME}.parquet")
+    if not path.exists():
+        return []
+    return sorted(storage.read_date_dimension(dataset_dir)['year'].unique().tolist())
+
+
+def source_files(source: str):
+    """Return the csv files of a directory or a glob pattern in sorted order."""
+    if Path(source).is_dir():
+        return sorted(str(path) for path in Path(source).glob('*.csv'))
+    return sorted(glob.glob(source))
+
+
+def process_source(source: str, dataset_dir: str, name_mapping: pd.DataFrame,
+                   chunksize: int = None, verbose: bool = False):
+    """Process a source file into its files in the line partitions, its cube and quality counts.
+
+    With a chunksize the file is streamed, holding one chunk in memory at
+    a time, and the cube is merged as the chunks arrive.
+    """
+    started = time.perf_counter()
+    name = manifest.source_name(source)
+    stations_orders = read_stations_orders(dataset_dir)
+    if chunksize:
+        chunks = pd.read_csv(source, chunksize=chunksize, **SOURCE_OPTIONS)
+    else:
+        # A single lazily read chunk, so reading is measured like the streamed chunks
+        chunks = (pd.read_csv(source, **SOURCE_OPTIONS) for _ in range(1))
+    cube = None
+    quality = None
+    stations = None
+    raw_rows = 0
+    rows = 0
+
+    def processed_chunks():
+        nonlocal name_mapping, cube, quality, stations, raw_rows, rows
+        for chunk in instrument.measured(chunks, 'etl.read', source=name):
+            raw_rows += len(chunk)
+            with instrument.measure('etl.text_processing', source=name, rows=len(chunk)):
+                name_mapping = txt.build_name_mapping(chunk, name_mapping)
+                chunk = txt.text_processing(chunk, name_mapping)
+            with instrument.measure('etl.quality', source=name, rows=len(chunk)):
+                chunk_quality = process.quality_counts(chunk, stations_orders)
+                quality = (chunk_quality if quality is None
+                           else process.combine_quality_counts([quality, chunk_quality]))
+            with instrument.measure('etl.data_processing', source=name, rows=len(chunk)):
+                processed_chunk = process.data_processing(chunk, verbose=verbose)
+            # Keep the cube merged as we go, its size depends on the answer, not the input
+            with instrument.measure('etl.cube', source=name, rows=len(processed_chunk)):
+                chunk_cube = rollups.build_cube(processed_chunk)
+                cube = chunk_cube if cube is None else rollups.combine_cubes([cube, chunk_cube])
+            # The distinct map points, so a build never reads the partitions back
+            with instrument.measure('etl.station_points', source=name, rows=len(processed_chunk)):
+                chunk_stations = rollups.station_points(processed_chunk)
+                stations = (chunk_stations if stations is None
+                            else rollups.combine_station_points([stations, chunk_stations]))
+            rows += len(processed_chunk)
+            if chunksize:
+                report_progress(rows, started, label=name)
+            yield processed_chunk
+
+    with instrument.measure('etl.source', source=name) as sample:
+        line_rows = storage.write_processed_chunks(processed_chunks(), dataset_dir, name)
+        if cube is not None:
+            storage.write_source_cube(cube, dataset_dir, name)
+            storage.write_source_quality(quality, dataset_dir, name)
+            storage.write_source_stations(stations, dataset_dir, name)
+        sample['rows'] = rows
+    report_progress(rows, started, label=name)
+    return {'source': source,
+            'name_mapping': name_mapping,
+            'raw_rows': raw_rows,
+            'rows': rows,
+            'line_rows': line_rows}
+
+
+def build(sources: list, dataset_dir: str, chunksize: int = None, workers: int = None,
+          csv: bool = False, full: bool = False):
+    """Build the files read by the app, processing only new or changed source files.
+
+    The outputs of the unchanged source files are kept and merged with the
+    outputs of the processed ones, and the outputs of source files no longer
+    given are removed. Many changed source files are processed in parallel
+    with a process pool, in a deterministic output order.
+    """
+    started = time.perf_counter()
+    # Fail before any output is touched when a source file is given twice
+    manifest.source_names(sources)
+    build_manifest = manifest.read_build_manifest(dataset_dir)
+    removed = []
+    if full or not manifest.artifacts_intact(build_manifest):
+        # Outputs of earlier builds can not be trusted, start over
+        storage.clear_processed_data(dataset_dir)
+        build_manifest = {'version': manifest.BUILD_VERSION, 'sources': {}, 'artifacts': {}}
+        pending = sources
+    else:
+        pending = manifest.changed_sources(sources, build_manifest)
+        removed = manifest.removed_sources(sources, build_manifest)
+    years = built_years(dataset_dir)
+    holidays_changed = not years or build_holidays(dataset_dir, years)[1]
+    csv_missing = csv and not Path(f"{dataset_dir}/{storage.PROCESSED_DATA_NAME}.csv").exists()
+    if not pending and not removed and not holidays_changed and not csv_missing:
+        print("Nothing changed since the last build.")
+        return
+
+    # Drop the outputs of source files which were deleted, renamed or moved
+    for name in removed:
+        print(f"Removing the outputs of {build_manifest['sources'][name]['path']}")
+        storage.remove_source_data(dataset_dir, name)
+        del build_manifest['sources'][name]
+
+    name_mapping = storage.read_name_mapping(dataset_dir)
+    if len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process_source, pending, repeat(dataset_dir),
+                                        repeat(name_mapping), repeat(chunksize)))
+    else:
+        results = [process_source(source, dataset_dir, name_mapping,
+                                  chunksize=chunksize, verbose=chunksize is None)
+                   for source in pending]
+
+    if results or removed:
+        if results:
+            storage.write_name_mapping(
+                txt.merge_name_mappings([result['name_mapping'] for result in results]),
+                dataset_dir)
+        stations_orders = read_stations_orders(dataset_dir)
+        source_rows = {name: {} for name in removed}
+        source_rows.update({manifest.source_name(result['source']): result['line_rows']
+                            for result in results})
+        storage.update_manifest(dataset_dir, source_rows, stations_orders=stations_orders)
+        # The map points of every line, drawn by the passengers page as they are
+        with instrument.measure('etl.station_geometry'):
+            stations = rollups.combine_station_points(storage.read_source_stations(dataset_dir))
+            storage.write_rollups({'station_geometry': rollups.build_station_geometry(
+                stations, stations_orders)}, dataset_dir)
+    # Build and save the rollups queried by the pages from the cubes of every source
+    with instrument.measure('etl.date_dimension'):
+        cube = rollups.combine_cubes(storage.read_source_cubes(dataset_dir))
+        dates = cube['date'].drop_duplicates()
+        # The holidays of every year in the data, unchanged years come from the cache
+        holiday_frame, _ = build_holidays(dataset_dir, dates.dt.year.unique())
+        date_dimension = process.build_date_dimension(
+            dates.dt.strftime('%Y%m%d').astype('int64'), holiday_frame)
+        storage.write_date_dimension(date_dimension, dataset_dir)
+    with instrument.measure('etl.rollups', rows=len(cube)):
+        storage.write_rollups(rollups.derive_rollups(cube, date_dimension), dataset_dir)
+    with instrument.measure('etl.quality_report'):
+        storage.write_quality_report(
+            process.quality_report(process.combine_quality_counts(
+                storage.read_source_quality(dataset_dir))), dataset_dir)
+    if csv:
+        with instrument.measure('etl.export_csv'):
+            storage.export_processed_csv(dataset_dir)
+
+    for result in results:
+        build_manifest['sources'][manifest.source_name(result['source'])] = {
+            'path': result['source'],
+            **manifest.fingerprint(result['source']),
+            'rows': result['raw_rows']}
+    manifest.write_build_manifest(manifest.record_artifacts(build_manifest, dataset_dir),
+                                  dataset_dir)
+    report_progress(sum(result['rows'] for result in results), started)
@@ -0,0 +1,142 @@
+"""This module builds the pre-aggregated rollups queried by the app pages."""
+
+import pandas as pd
+
+CUBE_KEYS = ['line', 'station_name', 'date', 'age']
+DATE_ATTRIBUTES = ['month', 'week_number', 'day_of_week']
+METRICS = ['passanger_cnt', 'passage_cnt', 'record_cnt']
+ROLLUP_NAMES = ['cube', 'daily', 'monthly', 'age_station', 'holiday', 'kpi', 'kpi_extremes',
+                'station_geometry']
+GEOMETRY_COLUMNS = ['line', 'station_name', 'latitude', 'longitude']
+KPI_METRICS = ['passanger_cnt', 'passage_cnt']
+# Number of highest and lowest rows kept for each extreme, rows tied with the last are kept too
+KPI_TOP_K = 3
+
+
+def build_cube(data: pd.DataFrame):
+    """Aggregate the processed rows to line x station x date x age."""
+    cube = data.groupby(CUBE_KEYS, observed=True).agg(
+        passanger_cnt=('passanger_cnt', 'sum'),
+        passage_cnt=('passage_cnt', 'sum'),
+        record_cnt=('passanger_cnt', 'size'))
+    cube.reset_index(inplace=True)
+    dates = data[['date'] + DATE_ATTRIBUTES].drop_duplicates('date')
+    cube = cube.merge(dates, on='date', how='left')
+    return cube
+
+
+def combine_cubes(cubes: list):
+    """Merge cubes built from separate chunks of the processed rows into one cube."""
+    cube = pd.concat(cubes, ignore_index=True)
+    cube = cube.groupby(CUBE_KEYS + DATE_ATTRIBUTES, observed=True)[METRICS].sum()
+    cube.reset_index(inplace=True)
+    return cube[CUBE_KEYS + METRICS + DATE_ATTRIBUTES]
+
+
+def derive_rollups(cube: pd.DataFrame, date_dimension: pd.DataFrame):
+    """Derive the daily, monthly, age and holiday rollups from the cube."""
+    daily = cube.groupby(['line', 'date', 'month', 'week_number', 'day_of_week', 'station_name'],
+                         observed=True)[METRICS].sum()
+    daily.reset_index(inplace=True)
+    monthly = cube.groupby(['line', 'month', 'station_name'], observed=True)[METRICS].sum()
+    monthly.reset_index(inplace=True)
+    age_station = cube.groupby(['line', 'age', 'station_name'], observed=True)[METRICS].sum()
+    age_station.reset_index(inplace=True)
+    holidays = date_dimension.loc[date_dimension['is_holiday'], ['date', 'holiday']]
+    holiday = daily.merge(holidays, on='date', how='inner')
+    return {'cube': cube,
+            'daily': daily,
+            'monthly': monthly,
+            'age_station': age_station,
+            'holiday': holiday,
+            'kpi': build_kpis(daily),
+            'kpi_extremes': build_kpi_extremes(daily, monthly, age_station)}
+
+
+def build_kpis(daily: pd.DataFrame):
+    """Compute the total, mean and record count of each metric for each line."""
+    kpis = []
+    for metric in KPI_METRICS:
+        kpi = daily.groupby('line', observed=True).agg(total=(metric, 'sum'),
+                                                       mean=(metric, 'mean'),
+                                                       records=('record_cnt', 'sum'))
+        kpi.reset_index(inplace=True)
+        kpi.insert(1, 'metric', metric)
+        kpis.append(kpi)
+    return pd.concat(kpis, ignore_index=True)
+
+
+def top_k(frame: pd.DataFrame, by: list, metric: str, ascending: bool, k: int = KPI_TOP_K):
+    """Return the k highest or lowest rows of each group with their rank.
+
+    Tied rows share the same rank, so a group can have more than k rows.
+    Rows of the same rank keep their order in the frame.
+    """
+    rank = frame.groupby(by, observed=True)[metric].rank(method='min', ascending=ascending)
+    rows = frame[rank <= k].assign(rank=rank[rank <= k].astype('int64'))
+    return rows.sort_values(by + ['rank'], kind='stable')
+
+
+def build_kpi_extremes(daily: pd.DataFrame, monthly: pd.DataFrame, age_station: pd.DataFrame):
+    """Collect the busiest and quietest station days, and stations per month and age group.
+
+    Every row names the metric, the scope ('day', 'month' or 'age'), the
+    group within the scope, the extreme ('max' or 'min') and the rank.
+    """
+    scopes = {'day': (daily, None), 'month': (monthly, 'month'), 'age': (age_station, 'age')}
+    extremes = []
+    for metric in KPI_METRICS:
+        for scope, (frame, group) in scopes.items():
+            by = ['line'] if group is None else ['line', group]
+            for extreme, ascending in (('max', False), ('min', True)):
+                rows = top_k(frame, by, metric, ascending)
+                extremes.append(pd.DataFrame({
+                    'line': rows['line'].astype(str),
+                    'metric': metric,
+                    'scope': scope,
+                    'group': rows[group].astype(str) if group is not None else '',
+                    'extreme': extreme,
+                    'rank': rows['rank'],
+                    'station_name': rows['station_name'].astype(str),
+                    'date': rows['date'] if 'date' in rows else pd.NaT,
+                    'value': rows[metric].astype('int64')}))
+    return pd.concat(extremes, ignore_index=True)
+
+
+def station_points(data: pd.DataFrame):
+    """Return the distinct line, station and coordinate rows in the order they appear."""
+    return data[GEOMETRY_COLUMNS].drop_duplicates()
+
+
+def combine_station_points(points: list):
+    """Merge the station points of separate chunks or source files, keeping the first order."""
+    return pd.concat(points, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def build_station_geometry(stations: pd.DataFrame, stations_orders: dict):
+    """Build the map points of each line in station order.
+
+    The points with coordinates are numbered in the order of the line's
+    station list and also form the polyline of the line. The stations
+    without coordinates follow with the missing flag set.
+    """
+    geometries = []
+    for line, line_stations in stations.groupby('line', observed=True):
+        points = line_stations.groupby(['latitude', 'longitude'], observed=True)[['station_name']].first()
+        points.reset_index(inplace=True)
+        points['station_name'] = points['station_name'].astype(str)
+        points.drop_duplicates('station_name', keep='first', inplace=True)
+        points.set_index('station_name', inplace=True)
+        points = points.reindex(stations_orders.get(line, []))
+        points.dropna(inplace=True)
+        points.reset_index(inplace=True)
+        points['missing'] = False
+        missing = line_stations[line_stations['latitude'].isna() | line_stations['longitude'].isna()]
+        missing = pd.DataFrame({'station_name': missing['station_name'].astype(str).unique()})
+        missing['missing'] = True
+        geometry = pd.concat([points, missing], ignore_index=True)
+        geometry.insert(0, 'line', str(line))
+        geometry.insert(1, 'position', range(len(geometry)))
+        geometries.append(geometry)
+    return pd.concat(geometries, ignore_index=True)[
+        ['line', 'position', 'station_name', 'latitude', 'longitude', 'missing']]
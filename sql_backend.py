@@ -0,0 +1,119 @@
+"""This module computes the rollups of a rail line with SQL over the processed parquet files.
+
+It is the DuckDB query backend of the aggregations, selected with
+RAIL_BACKEND=duckdb. The line filter, the sums by date, station, month
+and age group and the holiday join run inside DuckDB over the line's
+partition, reading only the needed columns in a single scan, so the app
+never loads the rows of a line into memory. The results match the rollups
+of the ETL row for row.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+import data_access as access
+import data_processing as process
+import data_storage as storage
+import rollups
+
+# The line's rows summed by date, station and age group in a single scan, reading only
+# the columns the queries use
+LINE_CUBE = """
+    CREATE TEMP TABLE line_cube AS
+    SELECT line, date, month, week_number, day_of_week, station_name, age,
+           sum(passanger_cnt)::BIGINT AS passanger_cnt,
+           sum(passage_cnt)::BIGINT AS passage_cnt,
+           count(*) AS record_cnt
+    FROM read_parquet($files)
+    WHERE line = $line
+    GROUP BY line, date, month, week_number, day_of_week, station_name, age"""
+SUMS = """sum(passanger_cnt)::BIGINT AS passanger_cnt,
+          sum(passage_cnt)::BIGINT AS passage_cnt,
+          sum(record_cnt)::BIGINT AS record_cnt"""
+
+QUERIES = {
+    'daily': f"""
+        SELECT line, date, month, week_number, day_of_week, station_name, {SUMS}
+        FROM line_cube
+        GROUP BY line, date, month, week_number, day_of_week, station_name
+        ORDER BY date, station_name""",
+    'monthly': f"""
+        SELECT line, month, station_name, {SUMS}
+        FROM line_cube
+        GROUP BY line, month, station_name
+        ORDER BY min(month(date)), station_name""",
+    'age_station': f"""
+        SELECT line, age, station_name, {SUMS}
+        FROM line_cube
+        GROUP BY line, age, station_name
+        ORDER BY age, station_name""",
+    'holiday': f"""
+        SELECT line_cube.line, line_cube.date, line_cube.month, line_cube.week_number,
+               line_cube.day_of_week, station_name, {SUMS}, any_value(dates.holiday) AS holiday
+        FROM line_cube
+        JOIN read_parquet($date_dimension) AS dates
+          ON dates.date = line_cube.date AND dates.is_holiday
+        GROUP BY line_cube.line, line_cube.date, line_cube.month, line_cube.week_number,
+                 line_cube.day_of_week, station_name
+        ORDER BY line_cube.date, station_name""",
+    'station_geometry': """
+        SELECT line, position, station_name, latitude, longitude, missing
+        FROM read_parquet($station_geometry)
+        WHERE line = $line
+        ORDER BY position""",
+}
+
+
+def connect():
+    """Open an in-memory DuckDB connection."""
+    import duckdb
+
+    return duckdb.connect()
+
+
+def rollup_types(frame: pd.DataFrame):
+    """Give a frame the column types of the rollups as the app loads them."""
+    if 'date' in frame:
+        frame['date'] = frame['date'].astype('datetime64[ms]')
+    return process.optimize_dtypes(frame)
+
+
+def query(connection, sql: str, parameters: dict):
+    """Run a query with the parameters it uses and return its result as a frame."""
+    parameters = {name: value for name, value in parameters.items() if f"${name}" in sql}
+    return rollup_types(connection.execute(sql, parameters).df())
+
+
+def line_rollups(dataset_dir: str, line: str):
+    """Compute the daily, monthly, age, holiday, KPI and map rollups of a line."""
+    files = Path(f"{dataset_dir}/{storage.PROCESSED_DATA_NAME}/"
+                 f"{storage.line_partition_name(line)}").glob('*.parquet')
+    parameters = {'files': sorted(str(path) for path in files),
+                  'line': line,
+                  'date_dimension': f"{dataset_dir}/{storage.DATE_DIMENSION_NAME}.parquet",
+                  'station_geometry': f"{dataset_dir}/rollups/station_geometry.parquet"}
+    connection = connect()
+    try:
+        connection.execute(LINE_CUBE, {'files': parameters['files'], 'line': line})
+        frames = {name: query(connection, sql, parameters) for name, sql in QUERIES.items()}
+    finally:
+        connection.close()
+    # The KPIs are derived from the small line rollups exactly as the ETL derives them
+    frames['kpi'] = rollup_types(rollups.build_kpis(frames['daily']))
+    frames['kpi_extremes'] = rollup_types(rollups.build_kpi_extremes(
+        frames['daily'], frames['monthly'], frames['age_station']))
+    return frames
+
+
+def compare(dataset_dir: str, line: str):
+    """Return the names of the rollups of a line whose SQL results differ from the ETL rollups."""
+    differing = []
+    for name, frame in line_rollups(dataset_dir, line).items():
+        expected = access.line_rollup(dataset_dir, name, line).reset_index(drop=True)
+        try:
+            pd.testing.assert_frame_equal(frame.reset_index(drop=True), expected,
+                                          check_dtype=False, check_categorical=False)
+        except AssertionError:
+            differing.append(name)
+    return differing
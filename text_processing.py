@@ -1,7 +1,6 @@
 """This module handling character conversions and text processing."""
 
 import pandas as pd
-import numpy as np
 
 translation_dict = {
     'ð' : 'g',
@@ -39,10 +38,61 @@ def remove_words(text:str, words_to_remove:str):
     return text
 
 
-def text_processing(data: pd.DataFrame):
-    """Apply text processing to related columns."""
-    data['town'] = data['town'].apply(lambda x: replace_chars(str(x)))
-    data['station_name'] = data['station_name'].apply(lambda x: replace_chars(str(x)))
-    data['station_name'] = data['station_name'].apply(lambda x: remove_words(x, words_to_remove))
-    data.replace('nan', np.nan, inplace=True)
+translation_table = str.maketrans(translation_dict)
+
+name_columns = ['town', 'station_name']
+
+
+def normalize_names(names: pd.Series, column: str):
+    """Translate characters and remove unnecessary words of unique names at once."""
+    canonical = names.str.translate(translation_table)
+    if column == 'station_name':
+        # Words are removed one after another like remove_words does,
+        # since removing a word can change which words match later
+        for word in words_to_remove:
+            canonical = canonical.str.replace(word, '', regex=False)
+    return canonical
+
+
+def build_name_mapping(data: pd.DataFrame, name_mapping: pd.DataFrame = None):
+    """Build the raw to canonical name mapping table of the name columns.
+
+    Only the raw names which are not in the given mapping yet are normalized.
+    """
+    if name_mapping is None:
+        name_mapping = pd.DataFrame(columns=['column', 'raw', 'canonical'])
+    new_mappings = [name_mapping]
+    for column in name_columns:
+        known = name_mapping.loc[name_mapping['column'] == column, 'raw']
+        raw = pd.Series(data[column].dropna().unique()).astype(str)
+        raw = raw[~raw.isin(known)]
+        if raw.empty:
+            continue
+        new_mappings.append(pd.DataFrame({'column': column,
+                                          'raw': raw.values,
+                                          'canonical': normalize_names(raw, column).values}))
+    name_mapping = pd.concat(new_mappings, ignore_index=True)
+    return name_mapping.sort_values(['column', 'raw'], ignore_index=True)
+
+
+def merge_name_mappings(name_mappings: list):
+    """Merge name mapping tables built from separate parts of the data."""
+    name_mapping = pd.concat(name_mappings, ignore_index=True)
+    name_mapping = name_mapping.drop_duplicates(['column', 'raw'])
+    return name_mapping.sort_values(['column', 'raw'], ignore_index=True)
+
+
+def text_processing(data: pd.DataFrame, name_mapping: pd.DataFrame = None):
+    """Apply text processing to related columns.
+
+    Every distinct raw name is normalized once through the mapping table
+    and the canonical names are mapped back onto all rows.
+    """
+    name_mapping = build_name_mapping(data, name_mapping)
+    for column in name_columns:
+        mapping = name_mapping[name_mapping['column'] == column]
+        codes, uniques = pd.factorize(data[column])
+        canonical = pd.Series(uniques).astype(str).map(
+            dict(zip(mapping['raw'], mapping['canonical'])))
+        data[column] = canonical.reindex(codes).values
     return data
@@ -1,26 +1,50 @@
 """This module obtains public holidays data for TR."""
 
+from pathlib import Path
+
 import pandas as pd
 import holidays
 
 
-def generate_holidays_data():
-    tr_holidays =  holidays.country_holidays('TR', years=[2022])
+def generate_holidays_data(years=(2022,)):
+    tr_holidays =  holidays.country_holidays('TR', years=sorted(years))
     holiday_frame = pd.DataFrame(list(tr_holidays.items()),
                                  columns=['Date', 'Holiday'])
     holiday_frame['Date'] = pd.to_datetime(holiday_frame['Date'])
-    return holiday_frame
+    return holiday_frame.sort_values('Date', ignore_index=True)
 
 
 # İsimleri bir sayaçla birleştiren işlevi tanımla
-def add_number_to_duplicates(names):
-    counter = {}
-    new_names = []
-    for name in names:
-        if name in counter:
-            counter[name] += 1
-            new_names.append(f"{name} {counter[name]}. Day")
-        else:
-            counter[name] = 1
-            new_names.append(name)
-    return new_names
+def add_number_to_duplicates(names, years=None):
+    """Number the repeated days of a holiday, counting again in every year."""
+    names = pd.Series(names, dtype=object).reset_index(drop=True)
+    keys = [names] if years is None else [pd.Series(years).reset_index(drop=True), names]
+    day = names.groupby(keys).cumcount() + 1
+    return names.where(day == 1, names + ' ' + day.astype(str) + '. Day').tolist()
+
+
+def holiday_calendar(years, cache_dir: str = None):
+    """Return the numbered holidays of the given years.
+
+    With a cache directory the calendar is saved there and read back for
+    the same set of years and version of the holidays package.
+    """
+    years = sorted({int(year) for year in years})
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / (f"tr_holidays_{holidays.__version__}_"
+                                  f"{'_'.join(str(year) for year in years)}.csv")
+        if path.exists():
+            return pd.read_csv(path, parse_dates=['Date'])
+    holiday_frame = generate_holidays_data(years)
+    holiday_frame['Holiday'] = add_number_to_duplicates(holiday_frame['Holiday'],
+                                                        holiday_frame['Date'].dt.year)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        holiday_frame.to_csv(path, index=False)
+    return holiday_frame
+
+
+def holiday_lookup(holiday_frame: pd.DataFrame):
+    """Return the holiday names indexed by their sorted dates."""
+    return holiday_frame.drop_duplicates('Date').set_index('Date')['Holiday'].sort_index()
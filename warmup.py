@@ -0,0 +1,87 @@
+"""This module fills the shared caches of the app pages before the first visitors.
+
+The pages start a warm-up in a background thread when the server process
+serves its first page. It builds one figure at a time and pauses after
+each, so the reruns of visitors are not slowed down by the figures it
+builds. Run `python warmup.py` to time a warm-up.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import aggregations as aggs
+import charts
+import data_access as access
+import figure_cache as figures
+
+# Seconds the background warm-up sleeps after each figure, giving the GIL to the reruns
+BACKGROUND_PAUSE = 0.1
+
+_started = False
+_lock = threading.Lock()
+
+
+def warm_line(dataset_dir: str, line: str, holiday_dates, pause: float = 0.0):
+    """Compute the aggregations and the default figures of both pages for a line.
+
+    Sleeps for the given pause after the aggregations and after each figure.
+    """
+    line_aggs = aggs.line_aggregations(dataset_dir, line)
+    time.sleep(pause)
+    for page_name in charts.PAGES:
+        for section, selection in charts.default_selections(line_aggs, page_name,
+                                                            holiday_dates).items():
+            charts.section_figure(page_name, section, line_aggs, selection)
+            time.sleep(pause)
+    return line
+
+
+def warm_up(dataset_dir: str, workers: int = None, verbose: bool = True, pause: float = 0.0):
+    """Warm up the caches for every line of the stations orders with a thread pool.
+
+    Returns the elapsed seconds.
+    """
+    started = time.perf_counter()
+    holiday_dates = access.load_holiday_dates(dataset_dir)
+    built_lines = {entry['line'] for entry in access.load_manifest(dataset_dir)['lines']}
+    lines = [line for line in access.load_stations_orders(dataset_dir)['line']
+             if line in built_lines]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for line in executor.map(partial(warm_line, dataset_dir, holiday_dates=holiday_dates,
+                                         pause=pause), lines):
+            if verbose:
+                print(f"{line}: warmed up after {time.perf_counter() - started:.1f} s")
+    elapsed = time.perf_counter() - started
+    if verbose:
+        print(f"Warmed up {len(lines)} lines in {elapsed:.1f} s "
+              f"({figures.figure_stats()['entries']} figures cached)")
+    return elapsed
+
+
+def start_warm_up(dataset_dir: str):
+    """Start a warm-up in a single background thread, once per server process."""
+    global _started
+    with _lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=warm_up, args=(dataset_dir,),
+                     kwargs={'workers': 1, 'verbose': False, 'pause': BACKGROUND_PAUSE},
+                     daemon=True).start()
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time a warm-up of the app caches.")
+    parser.add_argument('--workers', type=int,
+                        help="Number of threads (default: chosen by the thread pool).")
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help="Seconds to sleep after each figure, the background warm-up "
+                             f"of the pages uses one thread and {BACKGROUND_PAUSE}.")
+    args = parser.parse_args()
+    warm_up((Path().resolve() / "data").absolute().as_posix(), workers=args.workers,
+            pause=args.pause)